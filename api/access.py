@@ -0,0 +1,58 @@
+import logging
+
+from django.db.models import Count, Max
+
+from .consolidation import VersionedCache, consolidated_cache, get_data_version
+from .models import AppUser
+
+logger = logging.getLogger(__name__)
+
+
+def get_access_version():
+    """
+    Changes whenever an AppUser is created or saved (e.g. by an access-file upload).
+    """
+    agg = AppUser.objects.aggregate(latest=Max('updated_at'), total=Count('id'))
+    latest = agg['latest'].isoformat() if agg['latest'] else ''
+    return f"{agg['total']}:{latest}"
+
+
+class AccessIndex:
+    """
+    Consolidated frame with Position pre-joined from AppUser, the input the
+    rollup cube is built from.
+    """
+
+    def __init__(self, df):
+        # New frame over the same column arrays: the mapped snapshot is not copied
+        import pandas as pd
+
+        frame = pd.DataFrame({col: df[col].array for col in df.columns}, copy=False)
+        if frame.empty:
+            self.frame = frame
+            return
+
+        frame['Emp ID'] = frame['Emp ID'].astype(str).str.strip()
+        emp_position_map = {
+            str(employee_id).strip(): position
+            for employee_id, position in AppUser.objects.values_list('employee_id', 'position')
+        }
+        frame['Position'] = frame['Emp ID'].map(emp_position_map)
+
+        unmapped = frame[frame['Position'].isna()]['Emp ID'].unique()
+        if len(unmapped) > 0:
+            logger.warning("%d Emp IDs with no position mapping, e.g. %s", len(unmapped), list(unmapped[:20]))
+        frame['Position'] = frame['Position'].fillna('Unknown')
+        self.frame = frame
+
+
+def _access_index_version():
+    return f"{get_data_version()}:{get_access_version()}"
+
+
+def _build_access_index(version):
+    return AccessIndex(consolidated_cache.get())
+
+
+access_index_cache = VersionedCache(_build_access_index, _access_index_version)
+
@@ -0,0 +1,188 @@
+import time
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .models import AOPTarget
+
+BATCH_SIZE = 1000
+# Columns owned by the AOP file; seller1..4 and comments are user-entered and never touched by uploads
+UPLOAD_FIELDS = ['py_actuals', 'growth_percent', 'target', 'region']
+
+
+def get_aop_version():
+    """
+    Changes whenever AOP targets are uploaded, edited or deleted.
+    """
+    agg = AOPTarget.objects.aggregate(latest=Max('updated_at'), total=Count('id'))
+    latest = agg['latest'].isoformat() if agg['latest'] else ''
+    return f"{agg['total']}:{latest}"
+
+
+def _none_if_missing(value):
+    import pandas as pd
+
+    return None if pd.isna(value) else value
+
+
+def _key_part(series):
+    return series.where(series.notna(), '').astype(str).str.strip()
+
+
+def prepare_aop_frame(df):
+    """
+    Maps an AOP sheet to AOPTarget columns and computes targets for every row at once.
+    Later rows win when a (ShipTo, Emp ID) pair appears twice.
+    """
+    import pandas as pd
+
+    frame = pd.DataFrame({
+        'ship_to': _key_part(df['ShipTo']),
+        'emp_id': _key_part(df['Emp ID']),
+        'py_actuals': df['PY Actuals'].astype(float),
+        'growth_percent': df['Growth%'].astype(float).fillna(0),
+        'region': df['Region'].where(df['Region'].notna(), None),
+    })
+    frame['target'] = frame['py_actuals'] * (1 + frame['growth_percent'] / 100)
+    return frame.drop_duplicates(subset=['ship_to', 'emp_id'], keep='last')
+
+
+def _changed(merged):
+    import numpy as np
+    import pandas as pd
+
+    changed = pd.Series(False, index=merged.index)
+    for field in ['py_actuals', 'growth_percent', 'target']:
+        changed |= ~np.isclose(merged[f'{field}_new'], merged[f'{field}_old'].astype(float), equal_nan=True)
+    region_new = merged['region_new'].where(merged['region_new'].notna(), '').astype(str)
+    region_old = merged['region_old'].where(merged['region_old'].notna(), '').astype(str)
+    return changed | (region_new != region_old)
+
+
+def upsert_aop_targets(df):
+    """
+    Applies an AOP upload as a keyed diff on (ship_to, emp_id) in one transaction:
+    new keys are inserted, changed rows updated, missing keys deleted and
+    identical rows left alone. Returns counts and elapsed time.
+    """
+    import pandas as pd
+
+    started = time.perf_counter()
+    incoming = prepare_aop_frame(df)
+    now = timezone.now()
+
+    with transaction.atomic():
+        existing = pd.DataFrame.from_records(
+            AOPTarget.objects.select_for_update().order_by('id').values_list('id', 'ship_to', 'emp_id', *UPLOAD_FIELDS),
+            columns=['id', 'ship_to', 'emp_id'] + UPLOAD_FIELDS,
+        )
+        existing['ship_to'] = _key_part(existing['ship_to'])
+        existing['emp_id'] = _key_part(existing['emp_id'])
+        # Older delete-and-reload uploads could leave duplicate keys; keep the oldest row
+        duplicate_ids = existing.loc[existing.duplicated(subset=['ship_to', 'emp_id'], keep='first'), 'id'].tolist()
+        existing = existing.drop_duplicates(subset=['ship_to', 'emp_id'], keep='first')
+
+        merged = incoming.merge(existing, on=['ship_to', 'emp_id'], how='outer', suffixes=('_new', '_old'), indicator=True)
+        to_insert = merged[merged['_merge'] == 'left_only']
+        to_delete = merged[merged['_merge'] == 'right_only']
+        both = merged[merged['_merge'] == 'both']
+        to_update = both[_changed(both)]
+
+        AOPTarget.objects.bulk_create([
+            AOPTarget(
+                ship_to=row.ship_to,
+                emp_id=row.emp_id or None,
+                py_actuals=row.py_actuals_new,
+                growth_percent=row.growth_percent_new,
+                target=row.target_new,
+                region=_none_if_missing(row.region_new),
+            )
+            for row in to_insert.itertuples(index=False)
+        ], batch_size=BATCH_SIZE)
+
+        AOPTarget.objects.bulk_update([
+            AOPTarget(
+                id=int(row.id),
+                py_actuals=row.py_actuals_new,
+                growth_percent=row.growth_percent_new,
+                target=row.target_new,
+                region=_none_if_missing(row.region_new),
+                updated_at=now,
+            )
+            for row in to_update.itertuples(index=False)
+        ], UPLOAD_FIELDS + ['updated_at'], batch_size=BATCH_SIZE)
+
+        delete_ids = [int(pk) for pk in to_delete['id']] + duplicate_ids
+        for start in range(0, len(delete_ids), BATCH_SIZE):
+            AOPTarget.objects.filter(id__in=delete_ids[start:start + BATCH_SIZE]).delete()
+
+    return {
+        "inserted": len(to_insert),
+        "updated": len(to_update),
+        "unchanged": len(both) - len(to_update),
+        "deleted": len(delete_ids),
+        "elapsed_seconds": round(time.perf_counter() - started, 4),
+    }
+
+
+def aop_targets_for_user(user, qs=None):
+    """
+    AOP targets the user may see or edit: own region for DM/AM, own Emp ID for Sellers.
+    """
+    qs = AOPTarget.objects.all() if qs is None else qs
+    if user.position in ['DM', 'AM']:
+        return qs.filter(region=user.region)
+    if user.position == 'Seller':
+        return qs.filter(emp_id=user.employee_id)
+    return qs.none()
+
+
+def _valid_id(pk):
+    return isinstance(pk, int) and not isinstance(pk, bool)
+
+
+def apply_batch_edits(user, edits, serializer_class):
+    """
+    Validates many {id, fields} edits against the user's scope with one query,
+    recomputes targets and writes all valid rows with a single bulk_update.
+    Returns one result per edit, in request order.
+    """
+    ids = [edit.get('id') for edit in edits if isinstance(edit, dict)]
+    instances = aop_targets_for_user(user).in_bulk([pk for pk in ids if _valid_id(pk)])
+
+    results = []
+    changed = {}
+    changed_fields = set()
+    for edit in edits:
+        pk = edit.get('id') if isinstance(edit, dict) else None
+        fields = edit.get('fields') if isinstance(edit, dict) else None
+        if not _valid_id(pk) or not isinstance(fields, dict):
+            results.append({"id": pk, "status": "invalid", "errors": {"non_field_errors": ["Each edit needs an integer id and a fields object"]}})
+            continue
+        instance = instances.get(pk)
+        if instance is None:
+            results.append({"id": pk, "status": "not_found"})
+            continue
+        serializer = serializer_class(instance, data=fields, partial=True)
+        if not serializer.is_valid():
+            results.append({"id": pk, "status": "invalid", "errors": serializer.errors})
+            continue
+        for name, value in serializer.validated_data.items():
+            setattr(instance, name, value)
+        changed_fields.update(serializer.validated_data)
+        changed[pk] = instance
+        results.append({"id": pk, "status": "updated"})
+
+    now = timezone.now()
+    for instance in changed.values():
+        instance.target = instance.py_actuals * (1 + instance.growth_percent / 100)
+        instance.updated_at = now
+    if changed:
+        with transaction.atomic():
+            AOPTarget.objects.bulk_update(list(changed.values()), sorted(changed_fields | {'target', 'updated_at'}), batch_size=BATCH_SIZE)
+
+    for result in results:
+        if result["status"] == "updated":
+            result["data"] = serializer_class(changed[result["id"]]).data
+    return results
@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections, connections
+from django.http import StreamingHttpResponse
+
+from .metrics import track_queries
+
+# pandas/reportlab-heavy views share a small pool so they cannot occupy every
+# thread; cheap views get their own pool and never queue behind them
+EXECUTORS = {
+    'heavy': ThreadPoolExecutor(max_workers=settings.ASYNC_HEAVY_WORKERS, thread_name_prefix='sipcass-heavy'),
+    'light': ThreadPoolExecutor(max_workers=settings.ASYNC_LIGHT_WORKERS, thread_name_prefix='sipcass-light'),
+}
+
+
+def _run_view(view, request, *args, **kwargs):
+    """
+    Runs a sync DRF view, including rendering its response, in a pool thread.
+    The thread's DB connection is checked before and after, as Django does per request.
+    """
+    close_old_connections()
+    try:
+        with track_queries():
+            response = view(request, *args, **kwargs)
+            if callable(getattr(response, 'render', None)):
+                response = response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def offloaded_view(view_class, pool):
+    """
+    Async view that hands view_class to the named executor, leaving the event
+    loop free for other requests while pandas or reportlab work runs.
+    """
+    view = view_class.as_view()
+    run = sync_to_async(_run_view, thread_sensitive=False, executor=EXECUTORS[pool])
+
+    async def async_view(request, *args, **kwargs):
+        return await run(view, request, *args, **kwargs)
+
+    # Same as DRF's as_view(): authentication is by token, not session
+    async_view.csrf_exempt = True
+    async_view.view_class = view_class
+    return async_view
+
+
+def read_view(view_class, pool):
+    """
+    The offloaded async view when ASYNC_READ_VIEWS is on (ASGI deployments),
+    otherwise the plain sync view.
+    """
+    if settings.ASYNC_READ_VIEWS:
+        return offloaded_view(view_class, pool)
+    return view_class.as_view()
+
+
+def _close_stream(iterator):
+    try:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            close()
+    finally:
+        # The thread goes away with the stream, so its connection must too
+        connections.close_all()
+
+
+def iterate_in_thread(iterator):
+    """
+    Async iterator over a sync one. Each step runs on a thread owned by this
+    stream, so a generator reading a DB cursor keeps one connection and a
+    long download does not hold a pool thread.
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sipcass-stream')
+    step = sync_to_async(next, thread_sensitive=False, executor=executor)
+    close = sync_to_async(_close_stream, thread_sensitive=False, executor=executor)
+    done = object()
+
+    async def stream():
+        try:
+            while True:
+                chunk = await step(iterator, done)
+                if chunk is done:
+                    break
+                yield chunk
+        finally:
+            await close(iterator)
+            executor.shutdown(wait=False)
+
+    return stream()
+
+
+def streaming_response(request, iterator, **kwargs):
+    """
+    StreamingHttpResponse that streams under both servers. Under ASGI, Django
+    4.2 drains a sync iterator into a list before sending anything, so there
+    the iterator is handed over as an async one instead.
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        iterator = iterate_in_thread(iterator)
+    return StreamingHttpResponse(iterator, **kwargs)
@@ -0,0 +1,135 @@
+import threading
+from collections import OrderedDict
+
+from django.db.models import Count, Sum
+
+from .access import get_access_version
+from .aop import get_aop_version
+from .consolidation import VersionedCache, get_data_version
+from .metrics import timed
+from .models import AOPTarget
+from .payouts import payout_frame, payouts_for_user
+
+ATTAINMENT_COLUMNS = [
+    "Emp ID", "Emp Name", "Region", "Position", "Revenue", "GP",
+    "Target", "Ship Tos", "Attainment %", "Gap", "Rank",
+]
+
+# Finished tables kept per report; the least recently used scope goes first
+MAX_CACHED_SCOPES = 256
+
+
+def _attainment_version():
+    return f"{get_data_version()}:{get_aop_version()}:{get_access_version()}"
+
+
+def _scope_key(user):
+    # Everything payouts_for_user() and aop_targets_for_user() look at
+    if user.position == 'Seller':
+        return (user.position, user.region, str(user.employee_id).strip())
+    return (user.position, user.region)
+
+
+class AttainmentReport:
+    """
+    AOP targets summed per (Emp ID, region) for one version, plus the
+    finished tables of the MAX_CACHED_SCOPES role scopes used most recently.
+    """
+
+    def __init__(self):
+        import pandas as pd
+
+        rows = (
+            AOPTarget.objects.exclude(emp_id__isnull=True).exclude(emp_id='')
+            .values('emp_id', 'region')
+            .annotate(target=Sum('target'), ship_tos=Count('id'))
+            .order_by()
+        )
+        self.targets = pd.DataFrame.from_records(list(rows), columns=['emp_id', 'region', 'target', 'ship_tos'])
+        self._lock = threading.Lock()
+        self._by_scope = OrderedDict()
+
+    def _scoped_targets(self, user):
+        # Same rule as aop_targets_for_user()
+        targets = self.targets
+        if user.position in ['DM', 'AM']:
+            targets = targets[targets['region'] == user.region]
+        elif user.position == 'Seller':
+            targets = targets[targets['emp_id'] == user.employee_id]
+        else:
+            targets = targets.iloc[0:0]
+        return (
+            targets.groupby('emp_id', sort=False)
+            .agg(Target=('target', 'sum'), **{"Ship Tos": ('ship_tos', 'sum')})
+            .reset_index()
+            .rename(columns={'emp_id': 'Emp ID'})
+        )
+
+    def _build(self, user):
+        """
+        Actuals from the user's current SIPPayout rows, the rows raw data and
+        the summary read, merged with the targets they may see. An employee
+        missing from either side keeps the other side's figures, with
+        attainment, gap and rank left empty.
+        """
+        import numpy as np
+
+        actuals = payout_frame(payouts_for_user(user))[["Emp ID", "Emp Name", "Region", "Position", "Revenue", "GP"]]
+        actuals = actuals.astype({"Revenue": float, "GP": float})
+        frame = actuals.merge(self._scoped_targets(user), on="Emp ID", how='outer')
+        target = frame["Target"].where(frame["Target"] > 0)
+        frame["Attainment %"] = (frame["Revenue"] / target * 100).round(2)
+        frame["Gap"] = frame["Target"] - frame["Revenue"]
+        frame["Rank"] = frame["Attainment %"].rank(ascending=False, method='min')
+        frame = frame.sort_values(["Rank", "Emp ID"], na_position='last', ignore_index=True)[ATTAINMENT_COLUMNS]
+
+        # Overall attainment only counts employees with both a target and actuals
+        matched = frame["Attainment %"].notna()
+        matched_revenue = frame.loc[matched, "Revenue"].sum()
+        matched_target = frame.loc[matched, "Target"].sum()
+        totals = {
+            "Revenue": float(frame["Revenue"].sum()),
+            "GP": float(frame["GP"].sum()),
+            "Target": float(frame["Target"].sum()),
+            "Attainment %": round(float(matched_revenue / matched_target * 100), 2) if matched.any() else None,
+            "Gap": float(matched_target - matched_revenue) if matched.any() else None,
+            "Employees": len(frame),
+            "Met target": int(np.count_nonzero(frame["Attainment %"] >= 100)),
+        }
+        records = frame.astype(object).where(frame.notna(), None).to_dict('records')
+        for record in records:
+            for col in ["Ship Tos", "Rank"]:
+                if record[col] is not None:
+                    record[col] = int(record[col])
+        return {"data": records, "totals": totals}
+
+    def for_user(self, user):
+        key = _scope_key(user)
+        with self._lock:
+            result = self._by_scope.get(key)
+            if result is not None:
+                self._by_scope.move_to_end(key)
+                return result
+        result = self._build(user)
+        with self._lock:
+            result = self._by_scope.setdefault(key, result)
+            self._by_scope.move_to_end(key)
+            while len(self._by_scope) > MAX_CACHED_SCOPES:
+                self._by_scope.popitem(last=False)
+        return result
+
+
+def _build_attainment_report(version):
+    return AttainmentReport()
+
+
+attainment_cache = VersionedCache(_build_attainment_report, _attainment_version)
+
+
+def get_attainment(user):
+    """
+    Target vs. actual per Emp ID in the user's scope: {"data": [...], "totals": {...}}.
+    Cached per data, AOP and access version, per role scope; treat as read-only.
+    """
+    with timed('attainment'):
+        return attainment_cache.get().for_user(user)
@@ -0,0 +1,86 @@
+import threading
+import time
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import AppUser
+
+# Claims the views read from request.user
+USER_CLAIMS = ['employee_id', 'name', 'position', 'region', 'is_staff']
+TOKEN_VERSION_CLAIM = 'tv'
+# An unknown user id reloads the map (e.g. a user created after the last load), at most this often
+MISS_RELOAD_SECONDS = 1
+
+
+def issue_tokens(user):
+    """
+    Refresh/access pair carrying the user's role claims and token version.
+    Access tokens minted from the refresh token copy these claims.
+    """
+    refresh = RefreshToken.for_user(user)
+    for claim in USER_CLAIMS:
+        refresh[claim] = getattr(user, claim)
+    refresh[TOKEN_VERSION_CLAIM] = user.token_version
+    return refresh
+
+
+class TokenVersions:
+    """
+    Per-process {user id: token_version} map for active users, reloaded at most
+    every TOKEN_VERSION_TTL seconds, so checking a token costs no query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._loaded_at = None
+
+    def _stale(self, max_age):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > max_age
+
+    def _reload_if_stale(self, max_age):
+        if self._stale(max_age):
+            with self._lock:
+                if self._stale(max_age):
+                    self._versions = dict(AppUser.objects.filter(is_active=True).values_list('id', 'token_version'))
+                    self._loaded_at = time.monotonic()
+
+    def get(self, user_id):
+        self._reload_if_stale(settings.TOKEN_VERSION_TTL)
+        if user_id not in self._versions:
+            self._reload_if_stale(MISS_RELOAD_SECONDS)
+        return self._versions.get(user_id)
+
+    def invalidate(self):
+        self._loaded_at = None
+
+
+token_versions = TokenVersions()
+
+
+class ClaimsUser(TokenUser):
+    """
+    Stateless user built from token claims; attribute access such as
+    user.position falls through to the token.
+    """
+    is_active = True
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Authenticates from the token claims instead of loading AppUser. Tokens
+    issued before claims were added still go through the database lookup.
+    """
+
+    def get_user(self, validated_token):
+        if TOKEN_VERSION_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if token_versions.get(user_id) != validated_token[TOKEN_VERSION_CLAIM]:
+            raise InvalidToken("Token is no longer valid, please log in again")
+        return ClaimsUser(validated_token)
@@ -0,0 +1,390 @@
+import asyncio
+import io
+import json
+import os
+import platform
+import threading
+import time
+import tracemalloc
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+import numpy as np
+import pandas as pd
+from asgiref.sync import ThreadSensitiveContext
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.http.response import HttpResponseBase
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import path
+
+from .async_views import offloaded_view
+from .consolidation import consolidated_cache
+from .models import AppUser
+from .payouts import payout_records, payouts_for_user
+from .views import LatestFileView, LoginView, RawDataView, get_consolidated_data
+
+BENCH_PASSWORD = 'bench-pass'
+PERCENTILES = [50, 90, 95, 99]
+
+
+def generate_access_frame(employees, regions):
+    """
+    One DM and up to two AMs per region, everyone else a Seller.
+    """
+    rows = []
+    for i in range(employees):
+        region_index = i % regions
+        rank = i // regions
+        position = 'DM' if rank == 0 else ('AM' if rank < 3 else 'Seller')
+        rows.append({
+            'Position': position,
+            'Name': f'Employee {i}',
+            'Employee ID': f'E{i:06d}',
+            'Password': BENCH_PASSWORD,
+            'Region': f'Region {region_index}',
+        })
+    return pd.DataFrame(rows, columns=['Position', 'Name', 'Employee ID', 'Password', 'Region'])
+
+
+def generate_payout_frame(employees, regions, upload_index=0, seed=0):
+    rng = np.random.default_rng(seed + upload_index)
+    revenue = rng.uniform(10_000, 500_000, employees).round(2)
+    return pd.DataFrame({
+        'Emp ID': [f'E{i:06d}' for i in range(employees)],
+        'Emp Name': [f'Employee {i}' for i in range(employees)],
+        'Region': [f'Region {i % regions}' for i in range(employees)],
+        'Revenue': revenue,
+        'GP': (revenue * rng.uniform(0.1, 0.4, employees)).round(2),
+        'SIP Payout Amount': (revenue * rng.uniform(0.0, 0.05, employees)).round(2),
+        'Approval': rng.choice(['Yes', 'Not yet'], employees, p=[0.7, 0.3]),
+        'SIP Paid': rng.choice(['Yes', 'No'], employees, p=[0.6, 0.4]),
+    })
+
+
+def generate_aop_frame(employees, regions, ship_tos_per_employee=3, seed=0):
+    rng = np.random.default_rng(seed)
+    total = employees * ship_tos_per_employee
+    emp_index = np.arange(total) // ship_tos_per_employee
+    return pd.DataFrame({
+        'ShipTo': [f'S{i:07d}' for i in range(total)],
+        'PY Actuals': rng.uniform(1_000, 100_000, total).round(2),
+        'Growth%': rng.uniform(-5, 25, total).round(1),
+        'Region': [f'Region {i % regions}' for i in emp_index],
+        'Emp ID': [f'E{i:06d}' for i in emp_index],
+    })
+
+
+def workbook_bytes(df):
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def generate_workbooks(employees, regions, uploads, ship_tos_per_employee=3, seed=0):
+    """
+    {file name: xlsx bytes} for one access file, one AOP file and `uploads`
+    payout files that supersede each other in order.
+    """
+    workbooks = {
+        'access.xlsx': workbook_bytes(generate_access_frame(employees, regions)),
+        'aop.xlsx': workbook_bytes(generate_aop_frame(employees, regions, ship_tos_per_employee, seed)),
+    }
+    for index in range(uploads):
+        workbooks[f'payouts_{index}.xlsx'] = workbook_bytes(generate_payout_frame(employees, regions, index, seed))
+    return workbooks
+
+
+def _consume(response):
+    if not isinstance(response, HttpResponseBase):
+        return 0
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def peak_alloc_mb(call):
+    """
+    Peak Python-level allocation (numpy and pandas buffers included) while
+    call() runs and its response is read, above what was allocated before.
+    Memory Arrow or reportlab allocate natively is not seen. Traced
+    separately from the timed runs, since tracing slows every allocation.
+    """
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        _consume(call())
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return round((peak - baseline) / (1024 * 1024), 1)
+
+
+def summarise(samples, queries, statuses, nbytes, peak_mb=None):
+    latencies = np.array(samples) * 1000
+    result = {f"p{p}_ms": round(float(np.percentile(latencies, p)), 2) for p in PERCENTILES}
+    result.update({
+        "n": len(samples),
+        "mean_ms": round(float(latencies.mean()), 2),
+        "max_ms": round(float(latencies.max()), 2),
+        "first_ms": round(float(latencies[0]), 2),
+        "queries": int(np.median(queries)) if queries else 0,
+        "bytes": int(np.median(nbytes)) if nbytes else 0,
+        "statuses": sorted(set(statuses)),
+        "peak_alloc_mb": peak_mb,
+    })
+    return result
+
+
+def concurrency_urlconf(async_reads):
+    """
+    URLconf with the routes the concurrency benchmark hits, either as the sync
+    views gunicorn serves today or as the offloaded async views used under ASGI.
+    """
+    def view(view_class, pool):
+        return offloaded_view(view_class, pool) if async_reads else view_class.as_view()
+
+    urlconf = types.ModuleType(f"bench_urls_{'async' if async_reads else 'sync'}")
+    urlconf.urlpatterns = [
+        path('api/login/', LoginView.as_view(), name='login'),
+        path('api/raw-data/', view(RawDataView, 'heavy'), name='raw-data'),
+        path('api/latest-file/', view(LatestFileView, 'light'), name='latest-file'),
+    ]
+    return urlconf
+
+
+class BenchmarkRun:
+    """
+    Drives the API through the Django test client against an already migrated
+    database and collects per-endpoint latency, query counts and peak allocation.
+    """
+
+    def __init__(self, client_class, employees, regions, uploads, repeat, upload_repeat=1, ship_tos_per_employee=3, seed=0, only=None):
+        self.client_class = client_class
+        self.employees = employees
+        self.regions = regions
+        self.uploads = uploads
+        self.repeat = repeat
+        self.upload_repeat = upload_repeat
+        self.seed = seed
+        self.only = only
+        self.workbooks = generate_workbooks(employees, regions, uploads, ship_tos_per_employee, seed)
+        self.results = {}
+
+    def _wanted(self, name):
+        return not self.only or any(part in name for part in self.only)
+
+    def _measure(self, name, call, times, memory=True):
+        """
+        Runs call() `times` times. Sizes and statuses are recorded when call
+        returns a response. With memory, one more untimed call measures its
+        peak allocation; pass False for calls that cannot be repeated.
+        """
+        samples, queries, statuses, nbytes = [], [], [], []
+        for _ in range(times):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = call()
+                size = _consume(response)
+                samples.append(time.perf_counter() - started)
+            queries.append(len(captured))
+            nbytes.append(size)
+            statuses.append(response.status_code if isinstance(response, HttpResponseBase) else 0)
+        peak_mb = peak_alloc_mb(call) if memory else None
+        self.results[name] = summarise(samples, queries, statuses, nbytes, peak_mb)
+        return self.results[name]
+
+    def _upload(self, client, path, name):
+        upload = SimpleUploadedFile(name, self.workbooks[name])
+        return client.post(path, {'file': upload}, format='multipart')
+
+    def _token(self, employee_id):
+        response = self.client_class().post('/api/login/', {'employee_id': employee_id, 'password': BENCH_PASSWORD}, format='json')
+        return response.json()['access']
+
+    def _login(self, employee_id):
+        client = self.client_class()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {self._token(employee_id)}")
+        return client
+
+    def run_uploads(self):
+        AppUser.objects.create_user('BENCHADMIN', BENCH_PASSWORD, name='Bench admin', position='DM', region='Region 0', is_staff=True)
+        # Access first so payout positions resolve, then AOP, then payout history in order.
+        # Each stage logs in again: hashing a large access file can outlive an access token.
+        admin = self._login('BENCHADMIN')
+        self._measure('upload:access', lambda: self._upload(admin, '/api/access-file/upload/', 'access.xlsx'), self.upload_repeat, memory=False)
+        admin = self._login('BENCHADMIN')
+        self._measure('upload:aop', lambda: self._upload(admin, '/api/aop-targets/upload/', 'aop.xlsx'), self.upload_repeat)
+        admin = self._login('BENCHADMIN')
+        names = iter(f'payouts_{index}.xlsx' for index in range(self.uploads))
+
+        def upload_next_payout():
+            # Every payout file is uploaded under one name so each supersedes the last
+            upload = SimpleUploadedFile('payouts.xlsx', self.workbooks[next(names)])
+            return admin.post('/api/upload/', {'file': upload}, format='multipart')
+
+        self._measure('upload:payout', upload_next_payout, self.uploads, memory=False)
+
+    def run_functions(self):
+        def cold():
+            consolidated_cache.invalidate()
+            get_consolidated_data()
+
+        if self._wanted('fn:get_consolidated_data'):
+            self._measure('fn:get_consolidated_data:cold', cold, self.repeat)
+            self._measure('fn:get_consolidated_data:warm', get_consolidated_data, self.repeat)
+        for position in ['DM', 'AM', 'Seller']:
+            user = AppUser.objects.filter(position=position, region='Region 0').exclude(employee_id='BENCHADMIN').first()
+            if user is None:
+                continue
+            # What RawDataView, SummaryView and the PDF views scope with
+            name = f'fn:payouts_for_user:{position}'
+            if self._wanted(name):
+                self._measure(name, lambda: payout_records(payouts_for_user(user)), self.repeat)
+
+    def run_reads(self):
+        endpoints = [
+            ('raw-data', '/api/raw-data/', {}),
+            ('raw-data:page', '/api/raw-data/', {'page_size': 100}),
+            ('raw-data:csv', '/api/raw-data/', {'stream': 'csv'}),
+            ('raw-data:totals', '/api/raw-data/totals/', {}),
+            ('summary', '/api/summary/', {}),
+            ('rollup', '/api/rollup/', {}),
+            ('attainment', '/api/attainment/', {}),
+            ('latest-file', '/api/latest-file/', {}),
+            ('aop-targets', '/api/aop-targets/', {}),
+            ('aop-targets:page', '/api/aop-targets/', {'page_size': 100}),
+        ]
+        for position in ['DM', 'AM', 'Seller']:
+            user = AppUser.objects.filter(position=position, region='Region 0').exclude(employee_id='BENCHADMIN').first()
+            if user is None:
+                continue
+            client = self._login(user.employee_id)
+            for label, url, params in endpoints + [('pdf', f'/api/pdf/{user.employee_id}/', {})]:
+                name = f'GET {label} [{position}]'
+                if self._wanted(name):
+                    self._measure(name, lambda: client.get(url, params), self.repeat)
+            name = f'GET summary:304 [{position}]'
+            if self._wanted(name):
+                etag = client.get('/api/summary/')['ETag']
+                self._measure(name, lambda: client.get('/api/summary/', HTTP_IF_NONE_MATCH=etag), self.repeat)
+
+    def _concurrency_requests(self, clients):
+        # Heavy full-scope exports interleaved with cheap polls, all sent at once
+        requests = []
+        for _ in range(clients):
+            requests.append(('raw-data', '/api/raw-data/'))
+            requests.append(('latest-file', '/api/latest-file/'))
+        return requests
+
+    def _record_round(self, mode, outcomes, wall_seconds):
+        for kind in ['raw-data', 'latest-file']:
+            rows = [outcome for outcome in outcomes if outcome[0] == kind]
+            result = summarise([row[1] for row in rows], [], [row[2] for row in rows], [row[3] for row in rows])
+            result["wall_s"] = round(wall_seconds, 3)
+            result["throughput_rps"] = round(len(outcomes) / wall_seconds, 1)
+            self.results[f'concurrency:{mode}:{kind}'] = result
+
+    def _sync_round(self, token, clients, workers):
+        """
+        `workers` threads stand in for sync gunicorn workers; a request's latency
+        includes the time it waited for a free worker.
+        """
+        local = threading.local()
+
+        def call(kind, url, started):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            response = local.client.get(url, headers={"Authorization": f"Bearer {token}"})
+            size = _consume(response)
+            return kind, time.perf_counter() - started, response.status_code, size
+
+        with override_settings(ROOT_URLCONF=concurrency_urlconf(async_reads=False)):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(call, kind, url, started) for kind, url in self._concurrency_requests(clients)]
+                outcomes = [future.result() for future in futures]
+            self._record_round('sync', outcomes, time.perf_counter() - started)
+
+    def _async_round(self, token, clients):
+        async def call(kind, url, started):
+            # ASGIHandler gives every request its own context for sync middleware; the test client does not
+            async with ThreadSensitiveContext():
+                response = await AsyncClient().get(url, headers={"Authorization": f"Bearer {token}"})
+            return kind, time.perf_counter() - started, response.status_code, len(response.content)
+
+        async def round_trip():
+            started = time.perf_counter()
+            outcomes = await asyncio.gather(*(call(kind, url, started) for kind, url in self._concurrency_requests(clients)))
+            return outcomes, time.perf_counter() - started
+
+        with override_settings(ROOT_URLCONF=concurrency_urlconf(async_reads=True)):
+            outcomes, wall_seconds = asyncio.run(round_trip())
+            self._record_round('async', outcomes, wall_seconds)
+
+    def run_concurrency(self, clients, sync_workers):
+        """
+        Sends `clients` heavy raw-data requests and as many cheap latest-file
+        polls at once, first to the sync views behind `sync_workers` workers,
+        then to the offloaded async views, and records latency from send time.
+        """
+        AppUser.objects.create_user('BENCHALL', BENCH_PASSWORD, name='Bench all regions', position='DM', region='')
+        token = self._token('BENCHALL')
+        self._sync_round(token, clients, sync_workers)
+        self._async_round(token, clients)
+
+    def run(self, concurrency=0, sync_workers=2):
+        self.run_uploads()
+        self.run_functions()
+        self.run_reads()
+        if concurrency:
+            self.run_concurrency(concurrency, sync_workers)
+        return self.report()
+
+    def report(self):
+        return {
+            "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "environment": {
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "pandas": pd.__version__,
+                "database": connection.vendor,
+                "machine": platform.machine(),
+            },
+            "scale": {
+                "employees": self.employees,
+                "regions": self.regions,
+                "uploads": self.uploads,
+                "repeat": self.repeat,
+                "seed": self.seed,
+            },
+            "results": self.results,
+        }
+
+
+def save_baseline(report, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_reports(baseline, current, metric='p95_ms'):
+    """
+    Rows of (name, baseline, current, change %, query change) for benchmarks in both reports.
+    """
+    rows = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        change = (result[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+        rows.append((name, before[metric], result[metric], round(change, 1), result["queries"] - before["queries"]))
+    return rows
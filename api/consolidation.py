@@ -0,0 +1,386 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from .metrics import timed
+from .models import EmployeeData
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = 'snapshots'
+COMPACTED_DIR = 'compacted'
+
+PAYOUT_COLUMNS = ["Emp ID", "Emp Name", "Region", "Revenue", "GP", "SIP Payout Amount", "Approval", "SIP Paid"]
+NUMERIC_COLUMNS = ["Revenue", "GP", "SIP Payout Amount"]
+
+
+def get_data_version():
+    """
+    Fingerprint of the active upload set (ids plus uploaded_at).
+    Any upload or deactivation changes it, so it is safe to key caches on.
+    """
+    rows = EmployeeData.objects.filter(is_active=True).order_by('id').values_list('id', 'uploaded_at')
+    return _upload_set_version(rows)
+
+
+def _upload_set_version(rows):
+    digest = hashlib.sha1()
+    for pk, uploaded_at in sorted(rows):
+        digest.update(f"{pk}:{uploaded_at.isoformat()};".encode())
+    return digest.hexdigest()
+
+
+def upload_checksum(chunks):
+    """
+    sha256 hex digest of a file fed in chunks, so it is never read into memory whole.
+    """
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_chunks(file_path, chunk_size=1 << 20):
+    with open(file_path, 'rb') as f:
+        yield from iter(lambda: f.read(chunk_size), b'')
+
+
+def find_identical_upload(checksum, original_filename):
+    """
+    The active upload that re-uploading this file would only replace with an
+    identical copy: same name and content, and nothing active uploaded since.
+    An older file re-uploaded after others still has to be processed, since
+    it then takes precedence over them.
+    """
+    match = (
+        EmployeeData.objects
+        .filter(checksum=checksum, original_filename=original_filename, is_active=True)
+        .order_by('-uploaded_at')
+        .first()
+    )
+    if match is None or EmployeeData.objects.filter(is_active=True, uploaded_at__gt=match.uploaded_at).exists():
+        return None
+    return match
+
+
+def normalise_payout_frame(df):
+    """
+    Gives an uploaded payout sheet stable dtypes: Emp ID as stripped str,
+    numeric columns as float and other text columns as str (blanks kept as null).
+    """
+    import pandas as pd
+
+    df['Emp ID'] = df['Emp ID'].astype(str).str.strip()
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    for col in df.columns:
+        if col != 'Emp ID' and df[col].dtype == object:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def sidecar_path(excel_name):
+    excel_path = os.path.normpath(os.path.join(settings.MEDIA_ROOT, excel_name))
+    return os.path.splitext(excel_path)[0] + '.parquet'
+
+
+def write_sidecar(df, excel_name):
+    """
+    Persists a normalised columnar copy of an upload next to the workbook.
+    Written to a temp file first so readers never see a partial file.
+    """
+    path = sidecar_path(excel_name)
+    tmp_path = f"{path}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_upload_frame(excel_name):
+    """
+    Loads one upload, preferring the Parquet sidecar (memory-mapped) and
+    falling back to parsing the workbook for legacy uploads without one.
+    """
+    import pandas as pd
+
+    parquet_path = sidecar_path(excel_name)
+    if os.path.exists(parquet_path):
+        return pd.read_parquet(parquet_path, memory_map=True)
+    file_path = os.path.normpath(os.path.join(settings.MEDIA_ROOT, excel_name))
+    if not os.path.exists(file_path):
+        return None
+    return normalise_payout_frame(pd.read_excel(file_path))
+
+
+def compaction_manifest_path():
+    return os.path.join(settings.MEDIA_ROOT, COMPACTED_DIR, 'manifest.json')
+
+
+def read_compaction():
+    """
+    The current compaction manifest, {"file": ..., "upload_ids": [...], ...}, or None.
+    """
+    try:
+        with open(compaction_manifest_path()) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_compaction(df, records):
+    """
+    Stores the consolidated frame of records (the active uploads) as one
+    Parquet file, points the manifest at it and removes older compactions.
+    """
+    version = _upload_set_version((record.pk, record.uploaded_at) for record in records)
+    directory = os.path.join(settings.MEDIA_ROOT, COMPACTED_DIR)
+    os.makedirs(directory, exist_ok=True)
+    name = f"consolidated-{version}.parquet"
+    df.to_parquet(os.path.join(directory, f"{name}.tmp"), index=False)
+    os.replace(os.path.join(directory, f"{name}.tmp"), os.path.join(directory, name))
+    manifest = {
+        "file": f"{COMPACTED_DIR}/{name}",
+        "upload_ids": sorted(record.pk for record in records),
+        "version": version,
+        "rows": len(df),
+    }
+    tmp_path = f"{compaction_manifest_path()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, compaction_manifest_path())
+    for other in os.listdir(directory):
+        if other.startswith('consolidated-') and other != name:
+            os.remove(os.path.join(directory, other))
+    return manifest
+
+
+def upload_read_plan(records):
+    """
+    (compaction manifest or None, uploads still to read) for consolidating
+    records, newest first. The compaction stands in for the uploads it covers
+    while all of them are still active and every other active upload is
+    newer, which keeps it last in precedence order. Anything else, such as
+    one of them being superseded, means reading every upload again.
+    """
+    manifest = read_compaction()
+    if manifest is None:
+        return None, records
+    covered = set(manifest["upload_ids"])
+    by_id = {record.pk: record for record in records}
+    if not covered or not covered <= by_id.keys():
+        return None, records
+    newest_covered = max(by_id[pk].uploaded_at for pk in covered)
+    rest = [record for record in records if record.pk not in covered]
+    if any(record.uploaded_at <= newest_covered for record in rest):
+        return None, records
+    return manifest, rest
+
+
+def build_consolidated_data(records=None):
+    """
+    Reads and consolidates active Excel files into one DataFrame,
+    keeping latest record per Emp ID.
+    No filtering done here; filtering to be done separately.
+    Uploads covered by a usable compaction are read from its single file.
+    """
+    import pandas as pd
+
+    if records is None:
+        records = list(EmployeeData.objects.filter(is_active=True).order_by('-uploaded_at'))
+    active_files = records
+    dfs = []
+    compaction, rest = upload_read_plan(records)
+    if compaction is not None:
+        try:
+            with timed('read_upload'):
+                df = pd.read_parquet(os.path.join(settings.MEDIA_ROOT, compaction["file"]), memory_map=True)
+            covered = set(compaction["upload_ids"])
+            df['_uploaded_at'] = max(record.uploaded_at for record in records if record.pk in covered)
+            dfs.append(df)
+            active_files = rest
+        except Exception:
+            logger.exception("Error reading compacted uploads %s", compaction['file'])
+
+    for record in active_files:
+        try:
+            with timed('read_upload'):
+                df = read_upload_frame(record.excel_file.name)
+            if df is not None:
+                df['_uploaded_at'] = record.uploaded_at
+                dfs.append(df)
+        except Exception:
+            logger.exception("Error reading file %s", record.excel_file.name)
+            continue
+
+    if dfs:
+        with timed('consolidate'):
+            consolidated_df = (
+                pd.concat(dfs)
+                .sort_values('_uploaded_at', ascending=False, kind='stable')
+                .drop_duplicates(subset=['Emp ID'], keep='first')
+                .drop(columns=['_uploaded_at'])
+            )
+        return consolidated_df
+    return pd.DataFrame()
+
+
+def compact_uploads():
+    """
+    Folds the active payout uploads into one compacted file, so consolidating
+    them reads that file instead of each upload. Returns the manifest, or
+    None if there is nothing active.
+    """
+    records = list(EmployeeData.objects.filter(is_active=True).order_by('-uploaded_at'))
+    if not records:
+        return None
+    return write_compaction(build_consolidated_data(records), records)
+
+
+def snapshot_path(version):
+    return os.path.join(settings.MEDIA_ROOT, SNAPSHOT_DIR, f"consolidated-{version}.arrow")
+
+
+def publish_snapshot(df, version):
+    """
+    Writes the consolidated frame as an uncompressed Arrow IPC file that every
+    worker can map, then removes older versions. Workers still mapping an old
+    file keep a valid mapping until they move on.
+    """
+    import pyarrow as pa
+
+    path = snapshot_path(version)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+    for name in os.listdir(directory):
+        if name.startswith('consolidated-') and name.endswith('.arrow') and name != os.path.basename(path):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+    return path
+
+
+def map_snapshot(version):
+    """
+    The published frame for version, or None if none exists yet. String
+    columns and numeric columns without nulls are backed by a read-only memory
+    map of the snapshot; to_pandas() copies numeric columns with nulls (to
+    fill in NaN) and anything it converts to object, such as dates.
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    path = snapshot_path(version)
+    if not os.path.exists(path):
+        return None
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    return table.to_pandas(split_blocks=True, types_mapper={pa.string(): pd.StringDtype('pyarrow')}.get)
+
+
+def load_consolidated_data(version):
+    """
+    Maps the snapshot another worker already published for this data version;
+    otherwise consolidates the uploads and publishes the result under the
+    version of the records it was built from. That differs from version when
+    an upload lands in between, and the cache then moves on at its next check.
+    """
+    if settings.CONSOLIDATED_SNAPSHOTS:
+        try:
+            df = map_snapshot(version)
+            if df is not None:
+                return df
+        except Exception:
+            logger.exception("Error mapping snapshot %s", version)
+    records = list(EmployeeData.objects.filter(is_active=True).order_by('-uploaded_at'))
+    built_version = _upload_set_version((record.pk, record.uploaded_at) for record in records)
+    df = build_consolidated_data(records)
+    if settings.CONSOLIDATED_SNAPSHOTS:
+        try:
+            publish_snapshot(df, built_version)
+        except Exception:
+            # Other workers just build their own copy
+            logger.exception("Error publishing snapshot %s", built_version)
+    return df
+
+
+class VersionedCache:
+    """
+    Per-process cache of one expensive value, keyed by a version string;
+    builder(version) produces the value for a version.
+
+    Concurrent cold requests queue on a single lock, so only one of them
+    rebuilds; the rest pick up its result. The cached value is shared,
+    callers must treat it as read-only.
+    """
+
+    def __init__(self, builder, version_func):
+        self._builder = builder
+        self._version_func = version_func
+        self._build_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._entry = (None, None)
+        self._hits = 0
+        self._misses = 0
+        self._rebuilds = 0
+        self._last_rebuild_seconds = 0.0
+        self._total_rebuild_seconds = 0.0
+
+    def _count(self, hit):
+        with self._stats_lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+
+    def get(self):
+        version = self._version_func()
+        cached_version, df = self._entry
+        if cached_version == version:
+            self._count(hit=True)
+            return df
+
+        self._count(hit=False)
+        with self._build_lock:
+            # Another request may have rebuilt while we were waiting
+            cached_version, df = self._entry
+            if cached_version == version:
+                return df
+            started = time.perf_counter()
+            df = self._builder(version)
+            elapsed = time.perf_counter() - started
+            self._entry = (version, df)
+            with self._stats_lock:
+                self._rebuilds += 1
+                self._last_rebuild_seconds = elapsed
+                self._total_rebuild_seconds += elapsed
+        return df
+
+    def invalidate(self):
+        self._entry = (None, None)
+
+    def stats(self):
+        with self._stats_lock:
+            lookups = self._hits + self._misses
+            return {
+                "version": self._entry[0],
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups * 100, 2) if lookups else 0,
+                "rebuilds": self._rebuilds,
+                "last_rebuild_seconds": round(self._last_rebuild_seconds, 4),
+                "total_rebuild_seconds": round(self._total_rebuild_seconds, 4),
+            }
+
+
+consolidated_cache = VersionedCache(load_consolidated_data, get_data_version)
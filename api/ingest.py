@@ -0,0 +1,127 @@
+import logging
+import os
+
+from django.conf import settings
+from django.db import transaction
+
+from .aop import upsert_aop_targets
+from .consolidation import (
+    NUMERIC_COLUMNS, PAYOUT_COLUMNS, compact_uploads, file_chunks, find_identical_upload, normalise_payout_frame, upload_checksum, write_sidecar
+)
+from .models import EmployeeData
+from .payouts import ingest_payouts, payouts_for_user, sync_payout_positions
+from .pdf import evict_payslips
+from .provisioning import provision_users
+from .retention import prune_media
+from .validation import UploadValidationError, read_validated_sheet, require_columns
+
+logger = logging.getLogger(__name__)
+
+AOP_COLUMNS = ['ShipTo', 'PY Actuals', 'Growth%', 'Region', 'Emp ID']
+ACCESS_COLUMNS = ['Position', 'Name', 'Employee ID', 'Password', 'Region']
+
+PAYOUT_COLUMNS_MESSAGE = f"Missing columns. Expected: {PAYOUT_COLUMNS}"
+AOP_COLUMNS_MESSAGE = f"Excel must contain columns: {AOP_COLUMNS}"
+ACCESS_COLUMNS_MESSAGE = f"Excel must contain columns: {ACCESS_COLUMNS}"
+
+
+def _media_path(relative_path):
+    return os.path.join(settings.MEDIA_ROOT, relative_path)
+
+
+def identical_upload_result(record):
+    return {
+        "message": "Identical file is already the latest upload; nothing to process",
+        "duplicate": True,
+        "upload_id": record.pk,
+        "row_count": record.row_count,
+    }
+
+
+def _read_upload(job, tracker, columns, message, numeric_columns=(), required_columns=()):
+    """
+    Header check first, then a chunked, type-checked parse. The stored file is
+    removed if either step rejects it.
+    """
+    file_path = _media_path(job.file_path)
+    try:
+        with tracker.stage('header'):
+            require_columns(file_path, columns, message)
+        with tracker.stage('parse'):
+            df = read_validated_sheet(file_path, numeric_columns, required_columns)
+            job.row_count = len(df)
+    except UploadValidationError:
+        os.remove(file_path)
+        raise
+    return df
+
+
+def ingest_payout_file(job, tracker):
+    file_path = _media_path(job.file_path)
+    with tracker.stage('checksum'):
+        checksum = upload_checksum(file_chunks(file_path))
+        # The view already checked, but an identical job may have finished while this one was queued
+        identical = find_identical_upload(checksum, job.original_name)
+        if identical is not None:
+            os.remove(file_path)
+            return identical_upload_result(identical)
+    df = _read_upload(job, tracker, PAYOUT_COLUMNS, PAYOUT_COLUMNS_MESSAGE, NUMERIC_COLUMNS, ['Emp ID'])
+    df = normalise_payout_frame(df)
+    with tracker.stage('sidecar'):
+        try:
+            write_sidecar(df, job.file_path)
+        except Exception:
+            # Reads fall back to the workbook, so a failed sidecar is not fatal
+            logger.exception("Error writing sidecar for %s", job.file_path)
+    with tracker.stage('persist'):
+        with transaction.atomic():
+            EmployeeData.objects.filter(original_filename=job.original_name, is_active=True).update(is_active=False)
+            record = EmployeeData.objects.create(
+                excel_file=job.file_path,
+                original_filename=job.original_name,
+                checksum=checksum,
+                row_count=len(df),
+                is_active=True
+            )
+            ingest_payouts(record, df)
+        evict_payslips(df['Emp ID'].unique())
+    with tracker.stage('count'):
+        employee_count = payouts_for_user(job.submitted_by).count() if job.submitted_by else None
+    if settings.COMPACT_AFTER_UPLOAD:
+        with tracker.stage('compact'):
+            try:
+                compact_uploads()
+                prune_media()
+            except Exception:
+                # Only an optimisation; the upload itself has been stored
+                logger.exception("Error compacting uploads after %s", job.file_path)
+    return {"message": "File processed successfully", "employee_count": employee_count}
+
+
+def ingest_aop_file(job, tracker):
+    file_path = _media_path(job.file_path)
+    df = _read_upload(job, tracker, AOP_COLUMNS, AOP_COLUMNS_MESSAGE, ['PY Actuals', 'Growth%'], ['ShipTo', 'PY Actuals'])
+    with tracker.stage('persist'):
+        counts = upsert_aop_targets(df)
+        os.remove(file_path)
+    return {"message": "File uploaded and data saved.", **counts}
+
+
+def ingest_access_file(job, tracker):
+    file_path = _media_path(job.file_path)
+    df = _read_upload(job, tracker, ACCESS_COLUMNS, ACCESS_COLUMNS_MESSAGE, required_columns=['Employee ID'])
+    counts, position_changes = provision_users(df, tracker)
+    with tracker.stage('sync'):
+        if position_changes:
+            sync_payout_positions(position_changes)
+            evict_payslips(position_changes)
+        os.remove(file_path)
+    return {"message": "User access data uploaded successfully", **counts}
+
+
+# kind -> (pipeline, stage names in order, used for progress)
+PIPELINES = {
+    'payout': (ingest_payout_file, ['checksum', 'header', 'parse', 'sidecar', 'persist', 'count', 'compact']),
+    'aop': (ingest_aop_file, ['header', 'parse', 'persist']),
+    'access': (ingest_access_file, ['header', 'parse', 'prefetch', 'hash', 'write', 'sync']),
+}
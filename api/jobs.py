@@ -0,0 +1,96 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .ingest import PIPELINES
+from .models import UploadJob
+from .validation import UploadValidationError
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=settings.UPLOAD_JOB_WORKERS, thread_name_prefix='upload-job')
+
+
+class JobTracker:
+    """
+    Records the current stage, progress and per-stage timings on the job row.
+    """
+
+    def __init__(self, job, stages):
+        self.job = job
+        self.stages = stages
+
+    @contextmanager
+    def stage(self, name):
+        self.job.stage = name
+        self.job.save(update_fields=['stage'])
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.job.timings[name] = round(time.perf_counter() - started, 4)
+            if name in self.stages:
+                self.job.progress = int((self.stages.index(name) + 1) / len(self.stages) * 100)
+            self.job.save(update_fields=['timings', 'progress', 'row_count'])
+
+
+def enqueue_upload(kind, file_path, original_name, user):
+    """
+    Creates a queued job and hands it to the background worker once the
+    surrounding transaction has committed. With UPLOAD_JOBS_ASYNC off the job
+    runs inline and is returned in its final state.
+    """
+    job = UploadJob.objects.create(
+        kind=kind,
+        file_path=file_path,
+        original_name=original_name,
+        submitted_by_id=user.pk
+    )
+    if settings.UPLOAD_JOBS_ASYNC:
+        transaction.on_commit(lambda: _executor.submit(_run_in_thread, job.pk))
+    else:
+        run_job(job.pk)
+        job.refresh_from_db()
+    return job
+
+
+def _run_in_thread(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        # Worker threads get their own DB connection; don't leak it
+        connection.close()
+
+
+def run_job(job_id):
+    """
+    Claims a queued job and runs its pipeline. Safe to call from several
+    workers: only the one that flips queued -> running does the work.
+    """
+    claimed = UploadJob.objects.filter(pk=job_id, status='queued').update(status='running', started_at=timezone.now())
+    if not claimed:
+        return None
+    job = UploadJob.objects.get(pk=job_id)
+    pipeline, stages = PIPELINES[job.kind]
+    started = time.perf_counter()
+    try:
+        job.result = pipeline(job, JobTracker(job, stages))
+        job.status = 'succeeded'
+        job.progress = 100
+    except UploadValidationError as e:
+        job.status = 'failed'
+        job.errors = e.errors
+    except Exception as e:
+        logger.exception("Upload job %s failed", job.pk)
+        job.status = 'failed'
+        job.errors = [{"error": str(e)}]
+    job.timings['total'] = round(time.perf_counter() - started, 4)
+    job.stage = ''
+    job.finished_at = timezone.now()
+    job.save()
+    return job
@@ -0,0 +1,43 @@
+import os
+
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.consolidation import normalise_payout_frame, sidecar_path, write_sidecar
+from api.models import EmployeeData
+
+
+class Command(BaseCommand):
+    help = "Writes Parquet sidecars for EmployeeData uploads that only have the .xlsx"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--active-only', action='store_true', help="Only backfill active uploads")
+        parser.add_argument('--force', action='store_true', help="Rewrite sidecars that already exist")
+
+    def handle(self, *args, **options):
+        records = EmployeeData.objects.all()
+        if options['active_only']:
+            records = records.filter(is_active=True)
+
+        written = skipped = missing = failed = 0
+        for record in records:
+            excel_name = record.excel_file.name
+            if os.path.exists(sidecar_path(excel_name)) and not options['force']:
+                skipped += 1
+                continue
+            file_path = os.path.normpath(os.path.join(settings.MEDIA_ROOT, excel_name))
+            if not os.path.exists(file_path):
+                missing += 1
+                continue
+            try:
+                write_sidecar(normalise_payout_frame(pd.read_excel(file_path)), excel_name)
+                written += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Error writing sidecar for {excel_name}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Sidecars written: {written}, already present: {skipped}, "
+            f"missing workbook: {missing}, failed: {failed}"
+        ))
@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+
+from api.benchmarks import BenchmarkRun, compare_reports, generate_workbooks, load_baseline, save_baseline
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks uploads, consolidation and the read endpoints on synthetic workbooks "
+            "in a throwaway SQLite test database, e.g. DATABASE_URL=sqlite:///bench.sqlite3 manage.py benchmark")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=200)
+        parser.add_argument('--regions', type=int, default=4)
+        parser.add_argument('--uploads', type=int, default=3, help="Payout files uploaded in turn, each superseding the last")
+        parser.add_argument('--ship-tos', type=int, default=3, help="AOP rows per employee")
+        parser.add_argument('--repeat', type=int, default=20, help="Requests per read benchmark")
+        parser.add_argument('--upload-repeat', type=int, default=1, help="Times the access and AOP files are uploaded")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--only', nargs='*', help="Only run read/function benchmarks whose name contains one of these")
+        parser.add_argument('--baseline-dir', default=os.path.join(settings.BASE_DIR, 'benchmarks'))
+        parser.add_argument('--save', metavar='NAME', help="Save the report as baseline NAME")
+        parser.add_argument('--compare', metavar='NAME', help="Compare p95 latency against baseline NAME")
+        parser.add_argument('--max-regression', type=float, metavar='PCT',
+                            help="With --compare, fail if any benchmark's p95 is more than PCT percent slower")
+        parser.add_argument('--concurrency', type=int, default=0, metavar='CLIENTS',
+                            help="Also compare sync and async views with CLIENTS concurrent exports plus as many cheap polls")
+        parser.add_argument('--sync-workers', type=int, default=2, help="Sync workers simulated in the concurrency comparison")
+        parser.add_argument('--dump', metavar='DIR', help="Only write the synthetic workbooks to DIR")
+
+    def handle(self, *args, **options):
+        if options['dump']:
+            os.makedirs(options['dump'], exist_ok=True)
+            workbooks = generate_workbooks(options['employees'], options['regions'], options['uploads'], options['ship_tos'], options['seed'])
+            for name, content in workbooks.items():
+                with open(os.path.join(options['dump'], name), 'wb') as f:
+                    f.write(content)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {len(workbooks)} workbooks to {options['dump']}"))
+            return
+
+        if connection.vendor != 'sqlite':
+            raise CommandError("Benchmarks run against SQLite only; set DATABASE_URL=sqlite:///bench.sqlite3")
+        baseline = None
+        if options['compare']:
+            baseline_path = os.path.join(options['baseline_dir'], f"{options['compare']}.json")
+            if not os.path.exists(baseline_path):
+                raise CommandError(f"No baseline at {baseline_path}")
+            baseline = load_baseline(baseline_path)
+
+        media_root = tempfile.mkdtemp(prefix='sipcass-bench-')
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(MEDIA_ROOT=media_root, UPLOAD_JOBS_ASYNC=False, SECURE_SSL_REDIRECT=False, DEBUG=False):
+                report = BenchmarkRun(
+                    APIClient,
+                    employees=options['employees'],
+                    regions=options['regions'],
+                    uploads=options['uploads'],
+                    repeat=options['repeat'],
+                    upload_repeat=options['upload_repeat'],
+                    ship_tos_per_employee=options['ship_tos'],
+                    seed=options['seed'],
+                    only=options['only'],
+                ).run(concurrency=options['concurrency'], sync_workers=options['sync_workers'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        self.write_report(report)
+        if options['save']:
+            path = os.path.join(options['baseline_dir'], f"{options['save']}.json")
+            save_baseline(report, path)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {path}"))
+        if baseline is not None:
+            self.write_comparison(baseline, report, options['max_regression'])
+
+    def write_report(self, report):
+        scale = report['scale']
+        self.stdout.write(f"{scale['employees']} employees, {scale['regions']} regions, {scale['uploads']} payout uploads, "
+                          f"{report['environment']['database']}")
+        self.stdout.write(f"{'benchmark':<42} {'n':>4} {'p50':>9} {'p90':>9} {'p95':>9} {'p99':>9} {'queries':>8} {'bytes':>10} {'alloc MB':>8}  status")
+        for name, r in report['results'].items():
+            statuses = ','.join(str(code) for code in r['statuses'] if code)
+            peak = '-' if r.get('peak_alloc_mb') is None else r['peak_alloc_mb']
+            self.stdout.write(f"{name:<42} {r['n']:>4} {r['p50_ms']:>9} {r['p90_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} "
+                              f"{r['queries']:>8} {r['bytes']:>10} {peak:>8}  {statuses}")
+
+    def write_comparison(self, baseline, report, max_regression):
+        if baseline['scale'] != report['scale']:
+            self.stderr.write(f"Baseline scale {baseline['scale']} differs from this run")
+        self.stdout.write(f"{'benchmark':<42} {'base p95':>9} {'p95':>9} {'change %':>9} {'queries':>8}")
+        regressions = []
+        for name, before, after, change, query_change in compare_reports(baseline, report):
+            self.stdout.write(f"{name:<42} {before:>9} {after:>9} {change:>+9} {query_change:>+8}")
+            if max_regression is not None and change > max_regression:
+                regressions.append(name)
+        if regressions:
+            raise CommandError(f"p95 regressed by more than {max_regression}%: {', '.join(regressions)}")
@@ -0,0 +1,57 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.consolidation import build_consolidated_data, compact_uploads, upload_read_plan
+from api.models import EmployeeData
+from api.retention import prune_media
+
+
+def _timed_read():
+    """
+    (seconds, files read) for consolidating the active uploads from disk.
+    """
+    records = list(EmployeeData.objects.filter(is_active=True).order_by('-uploaded_at'))
+    compaction, rest = upload_read_plan(records)
+    started = time.perf_counter()
+    build_consolidated_data(records)
+    return time.perf_counter() - started, len(rest) + (compaction is not None)
+
+
+class Command(BaseCommand):
+    help = ("Compacts the active payout uploads into one de-duplicated file and prunes media "
+            "that the retention policy no longer needs")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=settings.UPLOAD_RETENTION_DAYS,
+                            help="Keep superseded payout uploads from the last N days")
+        parser.add_argument('--keep-inactive', type=int, default=settings.UPLOAD_RETENTION_KEEP,
+                            help="Always keep the N newest superseded payout uploads")
+        parser.add_argument('--no-compact', action='store_true', help="Only prune")
+        parser.add_argument('--no-prune', action='store_true', help="Only compact")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be pruned without deleting")
+
+    def handle(self, *args, **options):
+        if not options['no_compact']:
+            before_seconds, before_files = _timed_read()
+            manifest = compact_uploads()
+            if manifest is None:
+                self.stdout.write("No active uploads to compact")
+            else:
+                after_seconds, after_files = _timed_read()
+                self.stdout.write(
+                    f"Compacted {len(manifest['upload_ids'])} active uploads into {manifest['file']} ({manifest['rows']} rows)\n"
+                    f"Consolidation read: {before_seconds:.3f}s from {before_files} files before, "
+                    f"{after_seconds:.3f}s from {after_files} after"
+                )
+
+        if not options['no_prune']:
+            report = prune_media(options['keep_days'], options['keep_inactive'], options['dry_run'])
+            verb = "Would prune" if options['dry_run'] else "Pruned"
+            for directory, counts in report.items():
+                self.stdout.write(f"{verb} {counts['files']} files ({counts['bytes']} bytes) from {directory}/")
+            self.stdout.write(self.style.SUCCESS(
+                f"{verb} {sum(c['files'] for c in report.values())} files, "
+                f"{sum(c['bytes'] for c in report.values())} bytes reclaimed"
+            ))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from api.consolidation import read_upload_frame
+from api.models import EmployeeData, SIPPayout
+from api.payouts import build_payout_rows, refresh_current_payouts, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Loads payout rows for uploads that predate the SIPPayout table, then refreshes current rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Also load inactive uploads (kept as history)")
+
+    def handle(self, *args, **options):
+        records = EmployeeData.objects.filter(payouts__isnull=True)
+        if not options['all']:
+            records = records.filter(is_active=True)
+
+        loaded = rows = failed = 0
+        for record in records:
+            try:
+                df = read_upload_frame(record.excel_file.name)
+                if df is None:
+                    self.stderr.write(f"Missing file for upload {record.pk}: {record.excel_file.name}")
+                    failed += 1
+                    continue
+                objs = build_payout_rows(record, df)
+                SIPPayout.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+                loaded += 1
+                rows += len(objs)
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Error loading upload {record.pk}: {e}")
+
+        refresh_current_payouts()
+        self.stdout.write(self.style.SUCCESS(f"Uploads loaded: {loaded} ({rows} rows), failed: {failed}"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from api.jobs import run_job
+from api.models import UploadJob
+
+
+class Command(BaseCommand):
+    help = "Runs queued upload jobs in order, e.g. ones left behind by a restart"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requeue-running', action='store_true',
+                            help="Also retry jobs stuck in 'running' (only when no web worker is up)")
+
+    def handle(self, *args, **options):
+        if options['requeue_running']:
+            UploadJob.objects.filter(status='running').update(status='queued', started_at=None)
+
+        ran = 0
+        for job_id in UploadJob.objects.filter(status='queued').order_by('created_at').values_list('id', flat=True):
+            job = run_job(job_id)
+            if job is not None:
+                ran += 1
+                self.stdout.write(f"Job {job.pk} ({job.kind}): {job.status}")
+        self.stdout.write(self.style.SUCCESS(f"Jobs run: {ran}"))
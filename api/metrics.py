@@ -0,0 +1,225 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+BYTES_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+
+def _label_text(names, values):
+    pairs = ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+    return f'{{{pairs}}}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram per label set. Observing walks a dozen buckets
+    under a lock, cheap enough to do on every request.
+    """
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _label_text(self.labels + ['le'], label_values + (bound,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _label_text(self.labels + ['le'], label_values + ('+Inf',))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, label_values)} {total}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, label_values)} {count}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram('sipcass_request_duration_seconds', "Time spent handling a request", ['view', 'method'], LATENCY_BUCKETS)
+STAGE_SECONDS = Histogram('sipcass_stage_duration_seconds', "Time spent in a timed stage of a request", ['view', 'stage'], LATENCY_BUCKETS)
+REQUEST_QUERIES = Histogram('sipcass_request_db_queries', "Database queries run per request", ['view'], QUERY_BUCKETS)
+RESPONSE_BYTES = Histogram('sipcass_response_bytes', "Response body size", ['view'], BYTES_BUCKETS)
+RESPONSES = Counter('sipcass_responses_total', "Responses by view and status code", ['view', 'status'])
+BULK_PAYSLIPS = Counter('sipcass_bulk_payslips_total', "Payslips rendered into bulk ZIP exports", [])
+BULK_PAYSLIP_SECONDS = Histogram('sipcass_bulk_payslip_export_seconds', "Time spent rendering one bulk ZIP export", [], LATENCY_BUCKETS)
+REGISTRY = [REQUEST_SECONDS, STAGE_SECONDS, REQUEST_QUERIES, RESPONSE_BYTES, RESPONSES, BULK_PAYSLIPS, BULK_PAYSLIP_SECONDS]
+
+
+class RequestTiming:
+    """
+    Stage durations and database usage collected while one request is handled.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def count_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - started
+
+    def server_timing(self, total_seconds):
+        parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items()]
+        parts.append(f'db;desc="{self.queries} queries";dur={self.query_seconds * 1000:.1f}')
+        parts.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ', '.join(parts)
+
+
+_current_timing = contextvars.ContextVar('request_timing', default=None)
+
+
+@contextmanager
+def timed(stage):
+    """
+    Adds the block's duration to the current request's stage timings.
+    Outside a request (jobs, management commands) it only runs the block.
+    """
+    timing = _current_timing.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(stage, time.perf_counter() - started)
+
+
+def track_queries():
+    """
+    Counts this thread's queries against the current request, e.g. inside
+    an executor thread that an async view handed work to.
+    """
+    timing = _current_timing.get()
+    if timing is None:
+        return nullcontext()
+    return connection.execute_wrapper(timing.count_query)
+
+
+def _view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+def _response_size(response):
+    if not response.streaming:
+        return len(response.content)
+    length = response.get('Content-Length')
+    return int(length) if length else None
+
+
+class TimingMiddleware:
+    """
+    Times each request and its stages, adds a Server-Timing header and feeds
+    the per-process histograms served at /metrics. Works under WSGI and ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        timing = RequestTiming()
+        token = _current_timing.set(timing)
+        started = time.perf_counter()
+        try:
+            with track_queries():
+                response = self.get_response(request)
+        finally:
+            _current_timing.reset(token)
+        return self._finish(request, response, timing, started)
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+        timing = RequestTiming()
+        token = _current_timing.set(timing)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timing.reset(token)
+        return self._finish(request, response, timing, started)
+
+    def _finish(self, request, response, timing, started):
+        total_seconds = time.perf_counter() - started
+        view = _view_label(request)
+        REQUEST_SECONDS.observe(total_seconds, view, request.method)
+        REQUEST_QUERIES.observe(timing.queries, view)
+        for stage, seconds in timing.stages.items():
+            STAGE_SECONDS.observe(seconds, view, stage)
+        size = _response_size(response)
+        if size is not None:
+            RESPONSE_BYTES.observe(size, view)
+        RESPONSES.inc(view, response.status_code)
+        response['Server-Timing'] = timing.server_timing(total_seconds)
+        return response
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
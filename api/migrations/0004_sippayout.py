@@ -0,0 +1,73 @@
+# Generated by Django 4.2.11 on 2026-10-18 01:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def load_existing_uploads(apps, schema_editor):
+    """
+    Loads the rows of every active upload and flags the latest per Emp ID as
+    current, as manage.py load_payouts does, so the read views have data as
+    soon as this is deployed. An upload whose file is missing or unreadable is
+    skipped here; load_payouts reports it and can be re-run once it is fixed.
+    """
+    from api.consolidation import read_upload_frame
+    from api.payouts import payout_row_fields
+
+    AppUser = apps.get_model('api', 'AppUser')
+    EmployeeData = apps.get_model('api', 'EmployeeData')
+    SIPPayout = apps.get_model('api', 'SIPPayout')
+
+    positions = {str(employee_id).strip(): position for employee_id, position in AppUser.objects.values_list('employee_id', 'position')}
+    current = {}
+    # Oldest first, so a later upload's row replaces an earlier one as current
+    for record in EmployeeData.objects.filter(is_active=True).order_by('uploaded_at', 'id'):
+        try:
+            df = read_upload_frame(record.excel_file.name)
+        except Exception:
+            df = None
+        if df is None:
+            continue
+        rows = [
+            SIPPayout(upload=record, position=positions.get(fields['emp_id'], 'Unknown'), **fields)
+            for fields in payout_row_fields(df)
+        ]
+        SIPPayout.objects.bulk_create(rows, batch_size=1000)
+        current.update((row.emp_id, row.pk) for row in rows)
+
+    current_ids = sorted(current.values())
+    for start in range(0, len(current_ids), 1000):
+        SIPPayout.objects.filter(id__in=current_ids[start:start + 1000]).update(is_current=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_aoptarget_emp_id_alter_appuser_position'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SIPPayout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('emp_id', models.CharField(max_length=50)),
+                ('emp_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('region', models.CharField(blank=True, max_length=100, null=True)),
+                ('region_key', models.CharField(blank=True, max_length=100)),
+                ('position', models.CharField(default='Unknown', max_length=20)),
+                ('revenue', models.FloatField(blank=True, null=True)),
+                ('gp', models.FloatField(blank=True, null=True)),
+                ('sip_payout_amount', models.FloatField(blank=True, null=True)),
+                ('approval', models.CharField(blank=True, max_length=50, null=True)),
+                ('sip_paid', models.CharField(blank=True, max_length=50, null=True)),
+                ('extra', models.JSONField(blank=True, default=dict)),
+                ('is_current', models.BooleanField(default=False)),
+                ('upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payouts', to='api.employeedata')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['emp_id'], name='sippayout_emp_id_idx'), models.Index(fields=['is_current', 'emp_id'], name='sippayout_current_emp_idx'), models.Index(fields=['is_current', 'region_key', 'position'], name='sippayout_current_scope_idx')],
+            },
+        ),
+        migrations.RunPython(load_existing_uploads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 01:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_sippayout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appuser',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
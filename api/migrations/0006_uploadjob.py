@@ -0,0 +1,39 @@
+# Generated by Django 4.2.11 on 2026-10-18 01:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_appuser_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('payout', 'Payout data'), ('aop', 'AOP targets'), ('access', 'Access file')], max_length=10)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('file_path', models.CharField(max_length=500)),
+                ('original_name', models.CharField(max_length=255)),
+                ('stage', models.CharField(blank=True, max_length=50)),
+                ('progress', models.PositiveSmallIntegerField(default=0)),
+                ('row_count', models.IntegerField(blank=True, null=True)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('timings', models.JSONField(blank=True, default=dict)),
+                ('result', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('submitted_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='uploadjob_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 01:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_uploadjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appuser',
+            name='token_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
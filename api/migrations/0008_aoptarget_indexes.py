@@ -0,0 +1,21 @@
+# Generated by Django 4.2.11 on 2026-10-18 01:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_appuser_token_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aoptarget',
+            index=models.Index(fields=['region', 'id'], name='aoptarget_region_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aoptarget',
+            index=models.Index(fields=['emp_id', 'id'], name='aoptarget_emp_id_id_idx'),
+        ),
+    ]
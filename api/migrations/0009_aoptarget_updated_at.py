@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_aoptarget_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aoptarget',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
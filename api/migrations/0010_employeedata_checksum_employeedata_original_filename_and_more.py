@@ -0,0 +1,54 @@
+# Generated by Django 4.2.11 on 2026-10-18 02:01
+
+import hashlib
+import os
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_upload_metadata(apps, schema_editor):
+    """
+    Existing uploads get the stored file's name (what excel_file__endswith used
+    to match), a checksum where the workbook is still on disk and a row count
+    from their SIPPayout rows.
+    """
+    EmployeeData = apps.get_model('api', 'EmployeeData')
+    for record in EmployeeData.objects.annotate(payout_count=Count('payouts')):
+        record.original_filename = os.path.basename(record.excel_file.name)[:255]
+        record.row_count = record.payout_count or None
+        file_path = os.path.join(settings.MEDIA_ROOT, record.excel_file.name)
+        if os.path.exists(file_path):
+            digest = hashlib.sha256()
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            record.checksum = digest.hexdigest()
+        record.save(update_fields=['original_filename', 'row_count', 'checksum'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_aoptarget_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employeedata',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='employeedata',
+            name='original_filename',
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='employeedata',
+            name='row_count',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_upload_metadata, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.11 on 2026-10-18 02:04
+
+from django.db import migrations, models
+
+
+def backfill_validity(apps, schema_editor):
+    """
+    Best-effort history for existing rows: per Emp ID, each row up to the
+    current one is taken to have been valid from its upload until the next
+    upload's. Rows of later, since-deactivated uploads (and employees with no
+    current row) are left out of the history, since when they stopped being
+    current was never recorded.
+    """
+    SIPPayout = apps.get_model('api', 'SIPPayout')
+    rows = (
+        SIPPayout.objects
+        .order_by('emp_id', 'upload__uploaded_at', 'upload_id')
+        .values_list('id', 'emp_id', 'is_current', 'upload__uploaded_at')
+    )
+    chain = []
+    updates = []
+
+    def close_chain():
+        # chain only counts if it ends in the current row
+        if chain and chain[-1][1]:
+            for (pk, _, uploaded_at), following in zip(chain, chain[1:] + [None]):
+                updates.append(SIPPayout(id=pk, valid_from=uploaded_at, valid_to=following[2] if following else None))
+        chain.clear()
+
+    last_emp_id = None
+    for pk, emp_id, is_current, uploaded_at in rows.iterator(chunk_size=5000):
+        if emp_id != last_emp_id:
+            close_chain()
+            last_emp_id = emp_id
+        if not chain or not chain[-1][1]:
+            chain.append((pk, is_current, uploaded_at))
+    close_chain()
+    SIPPayout.objects.bulk_update(updates, ['valid_from', 'valid_to'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_employeedata_checksum_employeedata_original_filename_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sippayout',
+            name='valid_from',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sippayout',
+            name='valid_to',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='sippayout',
+            index=models.Index(fields=['valid_from', 'valid_to'], name='sippayout_validity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sippayout',
+            index=models.Index(fields=['region_key', 'position', 'valid_from'], name='sippayout_scope_validity_idx'),
+        ),
+        migrations.RunPython(backfill_validity, migrations.RunPython.noop),
+    ]
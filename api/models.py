@@ -2,8 +2,17 @@ from django.db import models
 from django.contrib.auth.hashers import make_password, check_password
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 
+ROLE_HIERARCHY = {
+    'DM': ['DM', 'AM', 'Seller'],
+    'AM': ['AM', 'Seller'],
+    'Seller': ['Seller'],
+}
+
 class EmployeeData(models.Model):
     excel_file = models.FileField(upload_to='uploads/')
+    original_filename = models.CharField(max_length=255, blank=True, db_index=True)  # as uploaded; later uploads with the same name supersede it
+    checksum = models.CharField(max_length=64, blank=True, db_index=True)  # sha256 of the workbook
+    row_count = models.IntegerField(blank=True, null=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
 
@@ -13,6 +22,82 @@ class EmployeeData(models.Model):
     def __str__(self):
         return f"File uploaded at {self.uploaded_at}"
 
+class SIPPayout(models.Model):
+    """
+    One payout row per employee per upload. The row picked by consolidation
+    (latest active upload per Emp ID) is flagged is_current.
+    valid_from/valid_to record when a row was the consolidated one (valid_to
+    null while it still is), so past consolidations can be queried; a row that
+    becomes current again is copied rather than reopened.
+    """
+    upload = models.ForeignKey(EmployeeData, on_delete=models.CASCADE, related_name='payouts')
+    emp_id = models.CharField(max_length=50)
+    emp_name = models.CharField(max_length=255, blank=True, null=True)
+    region = models.CharField(max_length=100, blank=True, null=True)
+    region_key = models.CharField(max_length=100, blank=True)  # lowercased/stripped region for role filters
+    position = models.CharField(max_length=20, default='Unknown')  # denormalised from AppUser
+    revenue = models.FloatField(blank=True, null=True)
+    gp = models.FloatField(blank=True, null=True)
+    sip_payout_amount = models.FloatField(blank=True, null=True)
+    approval = models.CharField(max_length=50, blank=True, null=True)
+    sip_paid = models.CharField(max_length=50, blank=True, null=True)
+    extra = models.JSONField(default=dict, blank=True)  # any columns beyond the expected ones
+    is_current = models.BooleanField(default=False)
+    valid_from = models.DateTimeField(blank=True, null=True)  # null if never current
+    valid_to = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['emp_id'], name='sippayout_emp_id_idx'),
+            models.Index(fields=['is_current', 'emp_id'], name='sippayout_current_emp_idx'),
+            models.Index(fields=['is_current', 'region_key', 'position'], name='sippayout_current_scope_idx'),
+            models.Index(fields=['valid_from', 'valid_to'], name='sippayout_validity_idx'),
+            models.Index(fields=['region_key', 'position', 'valid_from'], name='sippayout_scope_validity_idx'),
+        ]
+
+    def __str__(self):
+        return f"SIPPayout {self.emp_id} ({self.upload_id})"
+
+class UploadJob(models.Model):
+    """
+    Queued upload processed by the background worker in api/jobs.py.
+    """
+    KIND_CHOICES = (
+        ('payout', 'Payout data'),
+        ('aop', 'AOP targets'),
+        ('access', 'Access file'),
+    )
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    file_path = models.CharField(max_length=500)  # relative to MEDIA_ROOT
+    original_name = models.CharField(max_length=255)
+    submitted_by = models.ForeignKey('AppUser', on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_jobs')
+    stage = models.CharField(max_length=50, blank=True)
+    progress = models.PositiveSmallIntegerField(default=0)
+    row_count = models.IntegerField(blank=True, null=True)
+    errors = models.JSONField(default=list, blank=True)
+    timings = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='uploadjob_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"UploadJob {self.pk} ({self.kind}, {self.status})"
+
 class AOPTarget(models.Model):
     ship_to = models.CharField(max_length=255)
     py_actuals = models.FloatField()
@@ -26,6 +111,7 @@ class AOPTarget(models.Model):
     region = models.CharField(max_length=100, blank=True, null=True)
     comments = models.TextField(blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def save(self, *args, **kwargs):
         # Calculate target automatically before saving
@@ -34,6 +120,11 @@ class AOPTarget(models.Model):
 
     class Meta:
         ordering = ['-uploaded_at']
+        indexes = [
+            # Match the DM/AM (region) and Seller (emp_id) scopes, ordered by id for cursor pages
+            models.Index(fields=['region', 'id'], name='aoptarget_region_id_idx'),
+            models.Index(fields=['emp_id', 'id'], name='aoptarget_emp_id_id_idx'),
+        ]
 
     def __str__(self):
         return f"AOPTarget {self.ship_to} - Target: {self.target}"
@@ -69,6 +160,8 @@ class AppUser(AbstractBaseUser, PermissionsMixin):
 
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    token_version = models.PositiveIntegerField(default=0)  # bumped on role/region change to revoke issued tokens
 
     objects = AppUserManager()
 
@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class AOPTargetCursorPagination(CursorPagination):
+    """
+    Opt-in keyset pagination over AOPTarget ids: only applied when the client
+    sends ?page_size=, so existing callers still get the full list.
+    """
+    ordering = 'id'
+    page_size = None
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
@@ -0,0 +1,329 @@
+import base64
+import csv
+import io
+import json
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .consolidation import PAYOUT_COLUMNS
+from .metrics import timed
+from .models import AppUser, ROLE_HIERARCHY, SIPPayout
+
+# Spreadsheet column -> SIPPayout field
+PAYOUT_FIELDS = {
+    "Emp ID": 'emp_id',
+    "Emp Name": 'emp_name',
+    "Region": 'region',
+    "Revenue": 'revenue',
+    "GP": 'gp',
+    "SIP Payout Amount": 'sip_payout_amount',
+    "Approval": 'approval',
+    "SIP Paid": 'sip_paid',
+}
+
+BATCH_SIZE = 1000
+
+
+def _region_key(region):
+    return str(region).strip().lower() if region is not None else ''
+
+
+def _clean(value):
+    # NaN never equals itself; store it as NULL
+    return None if value != value else value
+
+
+def _batches(values):
+    values = sorted(values)
+    for start in range(0, len(values), BATCH_SIZE):
+        yield values[start:start + BATCH_SIZE]
+
+
+def payout_row_fields(df):
+    """
+    SIPPayout field values, region_key and extra included, for each row of a
+    normalised payout DataFrame; the first row wins for a repeated Emp ID.
+    """
+    df = df.drop_duplicates(subset=['Emp ID'], keep='first')
+    extra_cols = [col for col in df.columns if col not in PAYOUT_COLUMNS and not str(col).startswith('_')]
+    extras = json.loads(df[extra_cols].to_json(orient='records', date_format='iso')) if extra_cols else None
+
+    rows = []
+    values = df[PAYOUT_COLUMNS].to_dict('records')
+    for i, row in enumerate(values):
+        fields = {PAYOUT_FIELDS[col]: _clean(row[col]) for col in PAYOUT_COLUMNS}
+        fields['emp_id'] = str(fields['emp_id']).strip()
+        fields['region_key'] = _region_key(fields['region'])
+        fields['extra'] = extras[i] if extras else {}
+        rows.append(fields)
+    return rows
+
+
+def build_payout_rows(record, df):
+    """
+    Turns a normalised payout DataFrame into unsaved SIPPayout rows for one
+    upload, with Position already looked up from AppUser.
+    """
+    rows = [SIPPayout(upload=record, **fields) for fields in payout_row_fields(df)]
+
+    positions = {}
+    for batch in _batches({row.emp_id for row in rows}):
+        positions.update(AppUser.objects.filter(employee_id__in=batch).values_list('employee_id', 'position'))
+    for row in rows:
+        row.position = positions.get(row.emp_id, 'Unknown')
+    return rows
+
+
+def ingest_payouts(record, df):
+    """
+    Stores every row of an accepted upload and re-materialises the current
+    rows of the Emp IDs it touches.
+    """
+    with transaction.atomic():
+        rows = build_payout_rows(record, df)
+        SIPPayout.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        refresh_current_payouts({row.emp_id for row in rows})
+
+
+def _current_ids(candidates):
+    """
+    Ids of the latest row per Emp ID among candidates, i.e. what
+    get_consolidated_data() keeps.
+    """
+    candidates = (
+        candidates.filter(upload__is_active=True)
+        .order_by('emp_id', '-upload__uploaded_at', '-upload_id', '-id')
+        .values_list('id', 'emp_id')
+    )
+    current_ids = set()
+    last_emp_id = None
+    for pk, emp_id in candidates.iterator(chunk_size=BATCH_SIZE * 5):
+        if emp_id != last_emp_id:
+            current_ids.add(pk)
+            last_emp_id = emp_id
+    return current_ids
+
+
+def refresh_current_payouts(emp_ids=None):
+    """
+    Flags the latest row per Emp ID across active uploads as current,
+    mirroring what get_consolidated_data() keeps, and records the change in
+    the rows' validity: rows that stop being current are closed, rows that
+    become current are opened, and a row current once before is copied.
+
+    With emp_ids (the Emp IDs of a new upload) only those, plus any whose
+    current row belonged to an upload deactivated since, are recomputed, so
+    the cost follows the upload rather than the whole history.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        if emp_ids is None:
+            current_ids = _current_ids(SIPPayout.objects.all())
+            previous_ids = set(SIPPayout.objects.filter(is_current=True).values_list('id', flat=True))
+        else:
+            orphaned = SIPPayout.objects.filter(is_current=True, upload__is_active=False).values_list('emp_id', flat=True)
+            current_ids = set()
+            previous_ids = set()
+            for batch in _batches(set(emp_ids) | set(orphaned)):
+                current_ids |= _current_ids(SIPPayout.objects.filter(emp_id__in=batch))
+                previous_ids.update(SIPPayout.objects.filter(is_current=True, emp_id__in=batch).values_list('id', flat=True))
+
+        closed = sorted(previous_ids - current_ids)
+        opened = sorted(current_ids - previous_ids)
+        for start in range(0, len(closed), BATCH_SIZE):
+            SIPPayout.objects.filter(id__in=closed[start:start + BATCH_SIZE]).update(is_current=False, valid_to=now)
+        reopened = []
+        for start in range(0, len(opened), BATCH_SIZE):
+            batch = SIPPayout.objects.filter(id__in=opened[start:start + BATCH_SIZE])
+            reopened.extend(batch.filter(valid_from__isnull=False))
+            batch.filter(valid_from__isnull=True).update(is_current=True, valid_from=now)
+        for row in reopened:
+            row.pk = None
+            row.is_current = True
+            row.valid_from = now
+            row.valid_to = None
+        SIPPayout.objects.bulk_create(reopened, batch_size=BATCH_SIZE)
+
+
+def sync_payout_positions(emp_ids=None):
+    """
+    Copies AppUser.position onto the payout rows, history included, of the
+    given Emp IDs (every row when None). Call with the employees whose
+    position an access import created or changed.
+    """
+    position = AppUser.objects.filter(employee_id=OuterRef('emp_id')).values('position')[:1]
+    value = Coalesce(Subquery(position), Value('Unknown'))
+    if emp_ids is None:
+        SIPPayout.objects.update(position=value)
+        return
+    for batch in _batches(set(emp_ids)):
+        SIPPayout.objects.filter(emp_id__in=batch).update(position=value)
+
+
+def payouts_as_of(as_of):
+    """
+    The rows that were current at as_of: one per Emp ID, as consolidated then.
+    """
+    return SIPPayout.objects.filter(valid_from__lte=as_of).filter(Q(valid_to__isnull=True) | Q(valid_to__gt=as_of))
+
+
+def payouts_for_user(user, as_of=None):
+    """
+    Current payout rows visible to the user: their region (if set), the
+    positions ROLE_HIERARCHY allows them, and only their own row for a Seller.
+    With as_of, the rows current at that time instead; scoping uses today's positions.
+    """
+    qs = SIPPayout.objects.filter(is_current=True) if as_of is None else payouts_as_of(as_of)
+    if user.region:
+        qs = qs.filter(region_key=_region_key(user.region))
+    qs = qs.filter(position__in=ROLE_HIERARCHY.get(user.position, []))
+    if user.position == 'Seller':
+        qs = qs.filter(emp_id=str(user.employee_id).strip())
+    return qs
+
+
+def iter_payout_records(qs, chunk_size=2000):
+    """
+    Yields rows in the same shape RawDataView used to return from the DataFrame.
+    """
+    fields = list(PAYOUT_FIELDS.values()) + ['extra', 'position']
+    for values in qs.values_list(*fields).iterator(chunk_size=chunk_size):
+        record = dict(zip(PAYOUT_COLUMNS, values))
+        record.update(values[-2])
+        record['Position'] = values[-1]
+        yield record
+
+
+def payout_records(qs):
+    with timed('records'):
+        return list(iter_payout_records(qs))
+
+
+def payout_frame(qs):
+    """
+    The rows payout_records() would return, as a DataFrame built column-wise
+    from the query so no per-row dict is created.
+    """
+    import pandas as pd
+
+    with timed('records'):
+        rows = list(qs.values_list(*PAYOUT_FIELDS.values(), 'position', 'id'))
+        if not rows:
+            return pd.DataFrame(columns=PAYOUT_COLUMNS + ['Position'])
+        columns = list(zip(*rows))
+        frame = pd.DataFrame(dict(zip(PAYOUT_COLUMNS + ['Position'], columns[:-1])))
+        # Decoding the JSON column dominates the query, so only rows that carry extras fetch it.
+        # A sliced query (a page) cannot be filtered again, so its rows are looked up by id.
+        with_extras = SIPPayout.objects.filter(id__in=columns[-1]) if qs.query.is_sliced else qs
+        extras = dict(with_extras.exclude(extra={}).values_list('id', 'extra'))
+        if extras:
+            extra = pd.DataFrame.from_records([extras.get(pk) or {} for pk in columns[-1]])
+            extra = extra.drop(columns=PAYOUT_COLUMNS + ['Position'], errors='ignore')
+            frame = pd.concat([frame.drop(columns=['Position']), extra, frame[['Position']]], axis=1)
+        return frame
+
+
+def encode_cursor(emp_id):
+    return base64.urlsafe_b64encode(emp_id.encode()).decode()
+
+
+def decode_cursor(cursor):
+    return base64.b64decode(cursor.encode(), altchars=b'-_', validate=True).decode()
+
+
+def payout_page(qs, cursor, page_size, as_frame=False):
+    """
+    Keyset page ordered by Emp ID: rows after the cursor, plus the cursor for
+    the next page (None on the last one). Cost does not depend on page depth.
+    Rows come as payout_records(), or as payout_frame() with as_frame.
+    """
+    qs = qs.order_by('emp_id')
+    if cursor:
+        qs = qs.filter(emp_id__gt=decode_cursor(cursor))
+    page = qs[:page_size + 1]
+    records = payout_frame(page) if as_frame else payout_records(page)
+    next_cursor = None
+    if len(records) > page_size:
+        records = records.iloc[:page_size] if as_frame else records[:page_size]
+        last_emp_id = records["Emp ID"].iloc[-1] if as_frame else records[-1]["Emp ID"]
+        next_cursor = encode_cursor(last_emp_id)
+    return records, next_cursor
+
+
+def _stream_chunks(lines, rows_per_chunk=500):
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= rows_per_chunk:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_ndjson(qs):
+    """
+    One JSON object per line, emitted in chunks as rows come off the cursor.
+    """
+    return _stream_chunks(json.dumps(record) + '\n' for record in iter_payout_records(qs))
+
+
+def stream_csv(qs):
+    """
+    CSV with the expected payout columns plus Position; extra upload columns are dropped.
+    """
+    header = PAYOUT_COLUMNS + ['Position']
+
+    def lines():
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=header, extrasaction='ignore')
+        writer.writeheader()
+        for record in iter_payout_records(qs):
+            writer.writerow(record)
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+        yield out.getvalue()
+
+    return _stream_chunks(lines())
+
+
+PAYOUT_STREAM_FORMATS = {
+    'ndjson': (stream_ndjson, 'application/x-ndjson'),
+    'csv': (stream_csv, 'text/csv'),
+}
+
+
+def payout_totals(qs):
+    with timed('aggregate'):
+        totals = qs.aggregate(revenue=Sum('revenue'), gp=Sum('gp'), payout=Sum('sip_payout_amount'))
+    return {
+        "Revenue": totals['revenue'] or 0,
+        "GP": totals['gp'] or 0,
+        "SIP Payout Amount": totals['payout'] or 0,
+    }
+
+
+def payout_summary(qs):
+    """
+    Paid total, pending approvals and success rate in one query; None if no rows.
+    """
+    with timed('aggregate'):
+        agg = qs.aggregate(
+            paid_total=Sum('sip_payout_amount', filter=Q(sip_paid="Yes")),
+            paid_count=Count('id', filter=Q(sip_paid="Yes")),
+            pending=Count('id', filter=Q(approval="Not yet")),
+            total=Count('id'),
+        )
+    total_rows = agg['total']
+    if total_rows == 0:
+        return None
+    success_rate = round((agg['paid_count'] / total_rows) * 100, 2)
+    return {
+        "paid_total": agg['paid_total'] or 0,
+        "pending_approvals": agg['pending'],
+        "success_rate": success_rate
+    }
@@ -0,0 +1,263 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from django.conf import settings
+
+from .metrics import BULK_PAYSLIP_SECONDS, BULK_PAYSLIPS, timed
+
+# Bump whenever draw_payslip() output changes so cached slips are not reused
+PAYSLIP_LAYOUT_VERSION = 1
+
+
+def draw_payslip(p, employee, page_number=1):
+    """
+    Draws one SIP payout slip onto the current page of canvas p.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Table, TableStyle
+
+    width, height = letter
+
+    # Margins
+    margin = inch  # 72 points = 1 inch
+
+    # Title
+    p.setFont("Helvetica-Bold", 18)
+    p.drawCentredString(width / 2, height - margin + 10, "EMPLOYEE SIP PAYOUT SLIP")
+
+    # Separator line below title
+    p.setStrokeColor(colors.grey)
+    p.setLineWidth(1)
+    p.line(margin, height - margin, width - margin, height - margin)
+
+    # Employee info table data (label and value pairs)
+    data = [
+        ['Employee ID:', str(employee["Emp ID"])],
+        ['Name:', employee.get("Emp Name", "")],
+        ['Position:', employee.get("Position", "N/A")],
+        ['Region:', employee.get("Region", "")],
+        ['SIP Payout Amount:', f"${employee['SIP Payout Amount'] or 0:,.2f}"],
+    ]
+
+    # Create table with 2 columns: label and value
+    table = Table(data, colWidths=[2*inch, width - 2*margin - 2*inch])
+    style = TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 12),
+        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),  # Right align labels
+        ('ALIGN', (1, 0), (1, -1), 'LEFT'),   # Left align values
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#f2f2f2")),
+    ])
+    table.setStyle(style)
+
+    # Position table on the page below the title
+    table_width, table_height = table.wrap(0, 0)
+    table.drawOn(p, margin, height - margin - 30 - table_height)
+
+    # Footer with generation date and page number
+    p.setFont("Helvetica-Oblique", 8)
+    p.setFillColor(colors.grey)
+    footer_text = f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+    p.drawString(margin, margin / 2, footer_text)
+    p.drawRightString(width - margin, margin / 2, f"Page {page_number}")
+
+    p.showPage()
+
+
+def render_payslip(employee):
+    """
+    Renders a single-page slip and returns the PDF bytes.
+    Module-level and independent of Django state so it can run in a worker process.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter)
+    draw_payslip(p, employee)
+    p.save()
+    return buffer.getvalue()
+
+
+def payslip_etag(employee):
+    """
+    Content hash of the employee row plus layout version.
+    """
+    payload = json.dumps(employee, sort_keys=True, default=str)
+    return hashlib.sha256(f"{PAYSLIP_LAYOUT_VERSION}:{payload}".encode()).hexdigest()
+
+
+def _payslip_cache_dir(emp_id=None):
+    root = os.path.join(settings.MEDIA_ROOT, 'payslip_cache')
+    if emp_id is None:
+        return root
+    return os.path.join(root, hashlib.sha1(str(emp_id).encode()).hexdigest())
+
+
+def get_cached_payslip(employee):
+    """
+    Returns (etag, path) of the slip for this exact row, rendering it into
+    the on-disk cache on first use.
+    """
+    etag = payslip_etag(employee)
+    directory = _payslip_cache_dir(employee["Emp ID"])
+    path = os.path.join(directory, f"{etag}.pdf")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with timed('render_pdf'), open(tmp_path, 'wb') as f:
+            f.write(render_payslip(employee))
+        os.replace(tmp_path, path)
+    return etag, path
+
+
+def evict_payslips(emp_ids=None):
+    """
+    Drops cached slips for the given Emp IDs, or all of them when None.
+    """
+    if emp_ids is None:
+        shutil.rmtree(_payslip_cache_dir(), ignore_errors=True)
+        return
+    for emp_id in emp_ids:
+        shutil.rmtree(_payslip_cache_dir(emp_id), ignore_errors=True)
+
+
+def _render_named(employee):
+    return str(employee["Emp ID"]), render_payslip(employee)
+
+
+def render_merged_payslips(employees):
+    """
+    All slips as pages of one PDF. reportlab writes a single document
+    sequentially, so this runs in-process.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    with timed('render_pdf'):
+        buffer = io.BytesIO()
+        p = canvas.Canvas(buffer, pagesize=letter)
+        for page_number, employee in enumerate(employees, start=1):
+            draw_payslip(p, employee, page_number)
+        p.save()
+        return buffer.getvalue()
+
+
+class _ZipStream(io.RawIOBase):
+    """
+    Write-only, unseekable sink; zipfile then emits data descriptors so
+    each member can be flushed to the client as soon as it is written.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class _RenderPool:
+    """
+    The process pool every bulk export in this worker shares, created on
+    first use with PAYSLIP_BULK_MAX_WORKERS processes and replaced if a
+    worker dies.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def max_workers(self):
+        return max(1, settings.PAYSLIP_BULK_MAX_WORKERS)
+
+    def get(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def discard(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+render_pool = _RenderPool()
+
+
+def stream_payslip_zip(employees):
+    """
+    Renders slips on the shared process pool and yields ZIP bytes as each
+    slip is written, in order. At most twice the pool size is in flight, so
+    a slow client holds back rendering instead of letting slips pile up.
+    A manifest.json with throughput is written last and the export is
+    recorded in the bulk payslip metrics.
+    """
+    sink = _ZipStream()
+    started = time.perf_counter()
+    rendered = 0
+    executor = render_pool.get()
+    window = render_pool.max_workers * 2
+    pending = deque()
+    remaining = iter(employees)
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        try:
+            for employee in remaining:
+                pending.append(executor.submit(_render_named, employee))
+                if len(pending) >= window:
+                    break
+            while pending:
+                emp_id, pdf_bytes = pending.popleft().result()
+                next_employee = next(remaining, None)
+                if next_employee is not None:
+                    pending.append(executor.submit(_render_named, next_employee))
+                archive.writestr(f"sip_slip_{emp_id}.pdf", pdf_bytes)
+                rendered += 1
+                yield sink.drain()
+        except BrokenProcessPool:
+            render_pool.discard(executor)
+            raise
+        finally:
+            # Client gone or a slip failed: drop what this export still has queued
+            for future in pending:
+                future.cancel()
+
+        elapsed = time.perf_counter() - started
+        manifest = {
+            "slips": rendered,
+            "workers": render_pool.max_workers,
+            "elapsed_seconds": round(elapsed, 3),
+            "slips_per_second": round(rendered / elapsed, 2) if elapsed > 0 else 0,
+        }
+        BULK_PAYSLIPS.inc(amount=rendered)
+        BULK_PAYSLIP_SECONDS.observe(elapsed)
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+    yield sink.drain()
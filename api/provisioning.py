@@ -0,0 +1,126 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .authentication import token_versions
+from .models import AppUser
+
+BATCH_SIZE = 1000
+VALID_POSITIONS = ['DM', 'AM', 'Seller']
+# Below this many hashes a pool costs more to start than it saves
+POOL_THRESHOLD = 8
+
+
+def _password_task(task):
+    """
+    Returns a new hash for raw, or None when encoded already matches it.
+    Runs in a worker process; both branches cost one PBKDF2.
+    """
+    raw, encoded = task
+    if encoded and check_password(raw, encoded):
+        return None
+    return make_password(raw)
+
+
+def _hash_passwords(tasks):
+    workers = settings.PASSWORD_HASH_WORKERS
+    if workers <= 1 or len(tasks) < POOL_THRESHOLD:
+        return [_password_task(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_password_task, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+
+
+def _access_rows(df):
+    """
+    Normalised {employee_id: row} for rows with a valid position; later rows win.
+    """
+    rows = {}
+    skipped = 0
+    for employee_id, position, name, password, region in df[['Employee ID', 'Position', 'Name', 'Password', 'Region']].itertuples(index=False):
+        position = str(position).strip()
+        if position not in VALID_POSITIONS:
+            skipped += 1
+            continue
+        rows[str(employee_id).strip()] = {
+            'name': '' if name is None or name != name else str(name),
+            'position': position,
+            'region': '' if region is None or region != region else str(region),
+            'password': str(password),
+        }
+    return rows, skipped
+
+
+def provision_users(df, tracker):
+    """
+    Creates or updates AppUsers from an access sheet in bulk. Existing users
+    are fetched in one pass, passwords are only re-hashed when they changed,
+    hashing runs across a process pool and all writes share one transaction.
+    Returns the counts and the employee ids whose position is new or changed.
+    """
+    with tracker.stage('prefetch'):
+        rows, skipped = _access_rows(df)
+        employee_ids = list(rows)
+        existing = {}
+        for start in range(0, len(employee_ids), BATCH_SIZE):
+            for user in AppUser.objects.filter(employee_id__in=employee_ids[start:start + BATCH_SIZE]):
+                existing[user.employee_id] = user
+
+    with tracker.stage('hash'):
+        tasks = [
+            (row['password'], existing[employee_id].password if employee_id in existing else None)
+            for employee_id, row in rows.items()
+        ]
+        hashes = dict(zip(employee_ids, _hash_passwords(tasks)))
+
+    with tracker.stage('write'):
+        now = timezone.now()
+        to_create = []
+        to_update = []
+        role_changes = 0
+        position_changes = []
+        for employee_id, row in rows.items():
+            user = existing.get(employee_id)
+            if user is None:
+                to_create.append(AppUser(
+                    employee_id=employee_id,
+                    name=row['name'],
+                    position=row['position'],
+                    region=row['region'],
+                    password=hashes[employee_id],
+                ))
+                position_changes.append(employee_id)
+                continue
+            changed = (user.name, user.position, user.region) != (row['name'], row['position'], row['region'])
+            if (user.position, user.region) != (row['position'], row['region']):
+                # Revokes tokens that still carry the old role/region claims
+                user.token_version += 1
+                role_changes += 1
+            if user.position != row['position']:
+                position_changes.append(employee_id)
+            if hashes[employee_id] is not None:
+                user.password = hashes[employee_id]
+                changed = True
+            if changed:
+                user.name = row['name']
+                user.position = row['position']
+                user.region = row['region']
+                user.updated_at = now
+                to_update.append(user)
+
+        with transaction.atomic():
+            AppUser.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+            AppUser.objects.bulk_update(to_update, ['name', 'position', 'region', 'password', 'updated_at', 'token_version'], batch_size=BATCH_SIZE)
+        token_versions.invalidate()
+
+    counts = {
+        "created": len(to_create),
+        "updated": len(to_update),
+        "unchanged": len(existing) - len(to_update),
+        "skipped": skipped,
+        "passwords_rehashed": sum(1 for h in hashes.values() if h is not None),
+        "role_changes": role_changes,
+    }
+    return counts, position_changes
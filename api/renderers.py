@@ -0,0 +1,41 @@
+import json
+import sys
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def columnar_payload(frame):
+    """
+    {"columns": [...], "data": [[...], ...]} from a DataFrame, with NaN as
+    null. Values come out as Python scalars, so floats are encoded at full
+    precision, exactly as the JSON renderer sends them.
+    """
+    nullable = {name: frame[name].astype(object).where(frame[name].notna(), None) for name in frame.columns if frame[name].hasnans}
+    if nullable:
+        frame = frame.assign(**nullable)
+    split = frame.to_dict('split', index=False)
+    return {"columns": [str(name) for name in split["columns"]], "data": split["data"]}
+
+
+class ColumnarJSONRenderer(BaseRenderer):
+    """
+    Renders DataFrame values in the columnar shape above, so column names are
+    sent once instead of on every row; everything else is plain JSON.
+    Selected with Accept: application/vnd.sipcass.columnar+json or ?format=columnar.
+    """
+    media_type = 'application/vnd.sipcass.columnar+json'
+    format = 'columnar'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Data can only hold a DataFrame if pandas is already loaded; don't import it here
+        pd = sys.modules.get('pandas')
+        if pd is not None:
+            if isinstance(data, pd.DataFrame):
+                data = columnar_payload(data)
+            elif isinstance(data, dict):
+                data = {key: columnar_payload(value) if isinstance(value, pd.DataFrame) else value for key, value in data.items()}
+        return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode()
@@ -0,0 +1,92 @@
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .consolidation import COMPACTED_DIR, compaction_manifest_path, read_compaction
+from .models import EmployeeData, UploadJob
+
+# Directories under MEDIA_ROOT that uploads and compactions are written to
+PRUNED_DIRS = ['uploads', 'aop_uploads', 'access_uploads', COMPACTED_DIR]
+# Files younger than this are never orphans: a save may not have its job or record yet
+ORPHAN_GRACE_SECONDS = 3600
+
+
+def _media_relative(name):
+    # Older rows hold Windows separators or a leading media/ (see data.json)
+    name = name.replace('\\', '/')
+    if name.startswith('media/'):
+        name = name[len('media/'):]
+    return os.path.normpath(name)
+
+
+def _with_sidecar(name):
+    name = _media_relative(name)
+    return {name, os.path.splitext(name)[0] + '.parquet'}
+
+
+def retained_files(keep_days, keep_inactive):
+    """
+    MEDIA_ROOT-relative paths that must survive pruning: active payout
+    uploads and their sidecars, inactive ones within the retention policy
+    (uploaded in the last keep_days, or among the keep_inactive newest),
+    files of unfinished jobs and the current compaction.
+    """
+    keep = set()
+    # Jobs first: one that finishes after this query has already created its record
+    for name in UploadJob.objects.filter(status__in=['queued', 'running']).values_list('file_path', flat=True):
+        keep |= _with_sidecar(name)
+    for name in EmployeeData.objects.filter(is_active=True).values_list('excel_file', flat=True):
+        keep |= _with_sidecar(name)
+    inactive = EmployeeData.objects.filter(is_active=False).order_by('-uploaded_at')
+    cutoff = timezone.now() - timedelta(days=keep_days)
+    for name in inactive.filter(uploaded_at__gte=cutoff).values_list('excel_file', flat=True):
+        keep |= _with_sidecar(name)
+    for name in inactive.values_list('excel_file', flat=True)[:keep_inactive]:
+        keep |= _with_sidecar(name)
+    compaction = read_compaction()
+    if compaction is not None:
+        keep.add(_media_relative(compaction["file"]))
+    keep.add(os.path.relpath(compaction_manifest_path(), settings.MEDIA_ROOT))
+    return keep
+
+
+def prune_media(keep_days=None, keep_inactive=None, dry_run=False):
+    """
+    Deletes files under PRUNED_DIRS that nothing retained refers to: superseded
+    payout uploads past the retention policy, plus orphans such as workbooks
+    left behind by failed AOP/access jobs, stale temp files and old
+    compactions once they are older than ORPHAN_GRACE_SECONDS. Database rows
+    are kept, so payout history is unaffected. Returns counts and bytes per directory.
+    """
+    keep_days = settings.UPLOAD_RETENTION_DAYS if keep_days is None else keep_days
+    keep_inactive = settings.UPLOAD_RETENTION_KEEP if keep_inactive is None else keep_inactive
+    keep = retained_files(keep_days, keep_inactive)
+    recorded = set()
+    for name in EmployeeData.objects.values_list('excel_file', flat=True):
+        recorded |= _with_sidecar(name)
+    grace_cutoff = time.time() - ORPHAN_GRACE_SECONDS
+    report = {}
+    for directory in PRUNED_DIRS:
+        root = os.path.join(settings.MEDIA_ROOT, directory)
+        files = bytes_reclaimed = 0
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                relative = os.path.relpath(path, settings.MEDIA_ROOT)
+                if relative in keep:
+                    continue
+                try:
+                    stat = os.stat(path)
+                    if relative not in recorded and stat.st_mtime > grace_cutoff:
+                        continue
+                    if not dry_run:
+                        os.remove(path)
+                except FileNotFoundError:
+                    continue
+                files += 1
+                bytes_reclaimed += stat.st_size
+        report[directory] = {"files": files, "bytes": bytes_reclaimed}
+    return report
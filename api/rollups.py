@@ -0,0 +1,188 @@
+from .access import access_index_cache, get_access_version
+from .consolidation import VersionedCache, get_data_version
+from .metrics import timed
+from .models import ROLE_HIERARCHY
+
+TOP_N = 10
+DIMENSIONS = ['region', 'position', 'approval', 'sip_paid']
+SELLER_FIELDS = ["Emp ID", "Emp Name", "Region", "Revenue", "GP", "SIP Payout Amount"]
+
+
+def _number(value):
+    # NaN never equals itself
+    return 0.0 if value != value else float(value)
+
+
+def _label(value):
+    return None if value != value else value
+
+
+def _empty_measures():
+    return {
+        "count": 0, "Revenue": 0.0, "GP": 0.0, "SIP Payout Amount": 0.0,
+        "paid_total": 0.0, "paid_count": 0, "pending_approvals": 0,
+    }
+
+
+def _add(measures, cell):
+    measures["count"] += cell["count"]
+    for field in ["Revenue", "GP", "SIP Payout Amount"]:
+        measures[field] += cell[field]
+    if cell["sip_paid"] == "Yes":
+        measures["paid_total"] += cell["SIP Payout Amount"]
+        measures["paid_count"] += cell["count"]
+    if cell["approval"] == "Not yet":
+        measures["pending_approvals"] += cell["count"]
+
+
+def _finish(measures):
+    # Same success rate as payout_summary(): paid rows over all rows
+    measures["success_rate"] = round(measures["paid_count"] / measures["count"] * 100, 2) if measures["count"] else 0
+    return measures
+
+
+def _summarise(cells, top_sellers):
+    if not cells:
+        return None
+    totals = _empty_measures()
+    breakdowns = {dimension: {} for dimension in DIMENSIONS}
+    for cell in cells:
+        _add(totals, cell)
+        for dimension in DIMENSIONS:
+            key = cell["region_key"] if dimension == 'region' else cell[dimension]
+            entry = breakdowns[dimension].get(key)
+            if entry is None:
+                entry = breakdowns[dimension][key] = {dimension: cell[dimension], **_empty_measures()}
+            _add(entry, cell)
+    top_sellers = sorted(top_sellers, key=lambda s: s["Revenue"] if s["Revenue"] is not None else float('-inf'), reverse=True)[:TOP_N]
+    return {
+        "totals": _finish(totals),
+        **{f"by_{dimension}": [_finish(entry) for entry in breakdowns[dimension].values()] for dimension in DIMENSIONS},
+        "cells": [{key: value for key, value in cell.items() if key != "region_key"} for cell in cells],
+        "top_sellers": top_sellers,
+    }
+
+
+class RollupCube:
+    """
+    Payout measures grouped by region, position, approval and SIP Paid, plus
+    the top sellers by revenue per region, built from one consolidated frame.
+    Slicing to a user's scope only walks the cells, never the rows; each
+    Seller's own row is kept as a cell of its own, looked up by Emp ID.
+    """
+
+    def __init__(self, frame):
+        import pandas as pd
+
+        if frame.empty:
+            self.cells = []
+            self.top_sellers = {}
+            self.sellers = {}
+            return
+        frame = pd.DataFrame({
+            "region_key": frame["Region"].astype(str).str.strip().str.lower(),
+            "region": frame["Region"],
+            "position": frame["Position"],
+            "approval": frame["Approval"],
+            "sip_paid": frame["SIP Paid"],
+            **{field: frame[field] for field in SELLER_FIELDS if field != "Region"},
+        })
+        grouped = frame.groupby(["region_key", "position", "approval", "sip_paid"], dropna=False, sort=True).agg(
+            region=("region", "first"),
+            rows=("Emp ID", "size"),
+            revenue=("Revenue", "sum"),
+            gp=("GP", "sum"),
+            payout=("SIP Payout Amount", "sum"),
+        ).reset_index()
+        self.cells = [
+            {
+                "region_key": row.region_key,
+                "region": _label(row.region),
+                "position": _label(row.position),
+                "approval": _label(row.approval),
+                "sip_paid": _label(row.sip_paid),
+                "count": int(row.rows),
+                "Revenue": _number(row.revenue),
+                "GP": _number(row.gp),
+                "SIP Payout Amount": _number(row.payout),
+            }
+            for row in grouped.itertuples(index=False)
+        ]
+
+        sellers = frame[frame["position"] == "Seller"]
+        top = sellers.sort_values("Revenue", ascending=False, kind='stable').groupby("region_key", sort=False).head(TOP_N)
+        top = top.rename(columns={"region": "Region"})[["region_key"] + SELLER_FIELDS]
+        self.top_sellers = {}
+        for record in top.astype(object).where(top.notna(), None).to_dict('records'):
+            self.top_sellers.setdefault(record.pop("region_key"), []).append(record)
+
+        # Emp ID -> (cell, top seller record) of that Seller's row alone
+        self.sellers = {}
+        for row in sellers.astype(object).to_dict('records'):
+            cell = {
+                "region_key": row["region_key"],
+                "region": _label(row["region"]),
+                "position": "Seller",
+                "approval": _label(row["approval"]),
+                "sip_paid": _label(row["sip_paid"]),
+                "count": 1,
+                **{field: _number(row[field]) for field in ["Revenue", "GP", "SIP Payout Amount"]},
+            }
+            record = {field: _label(row["region" if field == "Region" else field]) for field in SELLER_FIELDS}
+            self.sellers[str(row["Emp ID"]).strip()] = (cell, record)
+
+    def slice(self, region, positions):
+        """
+        Totals, one-dimension breakdowns, the matching cells and top sellers
+        for rows in region (any region if empty) with a position in positions.
+        None if no row matches.
+        """
+        region_key = region.strip().lower() if region else None
+        cells = [
+            cell for cell in self.cells
+            if cell["position"] in positions and (region_key is None or cell["region_key"] == region_key)
+        ]
+        top_sellers = []
+        if "Seller" in positions:
+            for key, sellers in self.top_sellers.items():
+                if region_key is None or key == region_key:
+                    top_sellers.extend(sellers)
+        return _summarise(cells, top_sellers)
+
+    def seller_slice(self, emp_id, region, positions):
+        """
+        slice() of one Seller's own row: their cell and themselves as the only
+        top seller, if that row is in region (any if empty) and positions.
+        """
+        seller = self.sellers.get(str(emp_id).strip())
+        if seller is None or "Seller" not in positions:
+            return None
+        cell, record = seller
+        if region and cell["region_key"] != region.strip().lower():
+            return None
+        return _summarise([cell], [record])
+
+
+def _rollup_version():
+    # Positions come from AppUser, so access changes count too
+    return f"{get_data_version()}:{get_access_version()}"
+
+
+def _build_rollup_cube(version):
+    return RollupCube(access_index_cache.get().frame)
+
+
+rollup_cache = VersionedCache(_build_rollup_cube, _rollup_version)
+
+
+def get_rollup(user):
+    """
+    The rollup cube sliced to the user's scope, as in payouts_for_user();
+    None if nothing is in scope. A Seller gets the slice of their own row.
+    """
+    with timed('rollup'):
+        positions = ROLE_HIERARCHY.get(user.position, [])
+        cube = rollup_cache.get()
+        if user.position == 'Seller':
+            return cube.seller_slice(user.employee_id, user.region, positions)
+        return cube.slice(user.region, positions)
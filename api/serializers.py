@@ -1,8 +1,44 @@
 from rest_framework import serializers
 from .models import AOPTarget
 
+
+class SparseFieldsMixin:
+    """
+    Limits output to the comma-separated ?fields= query parameter, if given.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested = sparse_fields(request, self.Meta.model) if request else None
+        if requested:
+            for name in set(self.fields) - set(requested):
+                self.fields.pop(name)
+
+
+def sparse_fields(request, model):
+    """
+    Valid model field names from ?fields=, or None when not given.
+    """
+    raw = request.query_params.get('fields')
+    if not raw:
+        return None
+    model_fields = {field.name for field in model._meta.concrete_fields}
+    return [name for name in (part.strip() for part in raw.split(',')) if name in model_fields] or None
+
+
 class AOPTargetSerializer(serializers.ModelSerializer):
     class Meta:
         model = AOPTarget
         fields = '__all__'  # Or list fields you want to expose explicitly
         read_only_fields = ('target', 'uploaded_at')  # Calculated and auto fields
+
+
+class AOPTargetListSerializer(SparseFieldsMixin, AOPTargetSerializer):
+    """
+    Read-only listing with ?fields=; edits keep the full AOPTargetSerializer
+    so a ?fields= on them cannot drop writable fields.
+    """
+
+    class Meta(AOPTargetSerializer.Meta):
+        pass
@@ -1,3 +1,630 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from contextlib import contextmanager
+from datetime import timedelta
 
-# Create your tests here.
+import pandas as pd
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+from openpyxl import Workbook
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .access import access_index_cache
+from .aop import upsert_aop_targets
+from .authentication import ClaimsJWTAuthentication, issue_tokens, token_versions
+from .consolidation import PAYOUT_COLUMNS, build_consolidated_data, compact_uploads, read_compaction
+from .ingest import PAYOUT_COLUMNS_MESSAGE
+from .models import AOPTarget, AppUser, EmployeeData, SIPPayout, UploadJob
+from .payouts import decode_cursor, ingest_payouts, payout_page, payouts_as_of, sync_payout_positions
+from .provisioning import provision_users
+from .retention import ORPHAN_GRACE_SECONDS, prune_media
+from .rollups import RollupCube, get_rollup
+from .validation import UploadValidationError, read_header, read_validated_sheet, require_columns
+
+
+def payout_frame_for(revenues, region='North'):
+    """
+    A normalised payout upload with one row per {Emp ID: Revenue}.
+    """
+    emp_ids = list(revenues)
+    return pd.DataFrame({
+        "Emp ID": emp_ids,
+        "Emp Name": [f"Name {emp_id}" for emp_id in emp_ids],
+        "Region": [region] * len(emp_ids),
+        "Revenue": [float(revenues[emp_id]) for emp_id in emp_ids],
+        "GP": [10.0] * len(emp_ids),
+        "SIP Payout Amount": [5.0] * len(emp_ids),
+        "Approval": ["Yes"] * len(emp_ids),
+        "SIP Paid": ["Yes"] * len(emp_ids),
+    })
+
+
+def upload(name, revenues, region='North'):
+    # The database side of ingest_payout_file(): a re-upload supersedes the file of the same name
+    EmployeeData.objects.filter(original_filename=name, is_active=True).update(is_active=False)
+    record = EmployeeData.objects.create(excel_file=f'uploads/{name}', original_filename=name, is_active=True)
+    ingest_payouts(record, payout_frame_for(revenues, region))
+    return record
+
+
+def revenues(qs):
+    return dict(qs.values_list('emp_id', 'revenue'))
+
+
+class CurrentPayoutsTests(TestCase):
+
+    def test_current_rows_follow_uploads_and_reuploads(self):
+        first = upload('a.xlsx', {'E1': 100, 'E2': 100})
+        second = upload('b.xlsx', {'E2': 200, 'E3': 200})
+        self.assertEqual(revenues(SIPPayout.objects.filter(is_current=True)), {'E1': 100, 'E2': 200, 'E3': 200})
+        self.assertFalse(SIPPayout.objects.get(upload=first, emp_id='E2').is_current)
+
+        # Re-uploading b.xlsx without E2 hands E2 back to a.xlsx
+        upload('b.xlsx', {'E3': 300})
+
+        current = SIPPayout.objects.filter(is_current=True)
+        self.assertEqual(revenues(current), {'E1': 100, 'E2': 100, 'E3': 300})
+        self.assertEqual(current.count(), 3)
+        self.assertEqual(current.get(emp_id='E2').upload, first)
+        self.assertFalse(SIPPayout.objects.filter(upload=second, is_current=True).exists())
+
+    def test_positions_follow_access_changes(self):
+        user = AppUser.objects.create_user('E1', 'pw', name='Seller One', position='Seller', region='North')
+        upload('a.xlsx', {'E1': 100, 'E2': 100})
+        upload('b.xlsx', {'E1': 200})
+        self.assertEqual(set(SIPPayout.objects.filter(emp_id='E1').values_list('position', flat=True)), {'Seller'})
+        self.assertEqual(SIPPayout.objects.get(emp_id='E2').position, 'Unknown')
+
+        user.position = 'AM'
+        user.save()
+        sync_payout_positions(['E1'])
+
+        self.assertEqual(set(SIPPayout.objects.filter(emp_id='E1').values_list('position', flat=True)), {'AM'})
+        self.assertEqual(SIPPayout.objects.get(emp_id='E2').position, 'Unknown')
+
+class PayoutPageTests(TestCase):
+
+    def setUp(self):
+        upload('a.xlsx', {f'E{i}': 100 + i for i in range(1, 6)})
+        self.qs = SIPPayout.objects.filter(is_current=True)
+
+    def pages(self, page_size, as_frame=False):
+        pages, cursor = [], None
+        while True:
+            records, cursor = payout_page(self.qs, cursor, page_size, as_frame=as_frame)
+            pages.append((list(records["Emp ID"]) if as_frame else [record["Emp ID"] for record in records], cursor))
+            if cursor is None:
+                return pages
+
+    def test_cursor_round_trip(self):
+        pages = self.pages(2)
+        self.assertEqual([emp_ids for emp_ids, _ in pages], [['E1', 'E2'], ['E3', 'E4'], ['E5']])
+        self.assertEqual([decode_cursor(cursor) for _, cursor in pages[:-1]], ['E2', 'E4'])
+        self.assertEqual(self.pages(2, as_frame=True), pages)
+
+    def test_full_last_page_has_no_cursor(self):
+        pages = self.pages(5)
+        self.assertEqual(pages, [(['E1', 'E2', 'E3', 'E4', 'E5'], None)])
+        records, cursor = payout_page(self.qs, None, 10)
+        self.assertEqual((len(records), cursor), (5, None))
+
+def client_for(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+class TempMediaMixin:
+    """
+    Points MEDIA_ROOT at a fresh directory for each test.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+class BulkPayslipZipTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        manager = AppUser.objects.create_user('DM1', 'pw', name='DM One', position='DM', region='North')
+        for employee_id, region in [('E1', 'North'), ('E2', 'North'), ('E3', 'South')]:
+            AppUser.objects.create_user(employee_id, 'pw', name=f'Seller {employee_id}', position='Seller', region=region)
+        upload('a.xlsx', {'E2': 200, 'E1': 100})
+        upload('b.xlsx', {'E3': 300}, region='South')
+        self.client = client_for(manager)
+
+    def test_zip_holds_one_slip_per_employee_in_scope(self):
+        response = self.client.get('/api/pdf/bulk/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertEqual(response['X-Slip-Count'], '2')
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ['sip_slip_E1.pdf', 'sip_slip_E2.pdf', 'manifest.json'])
+        self.assertTrue(archive.read('sip_slip_E1.pdf').startswith(b'%PDF'))
+        self.assertEqual(json.loads(archive.read('manifest.json'))['slips'], 2)
+
+class PayslipETagTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        manager = AppUser.objects.create_user('DM1', 'pw', name='DM One', position='DM', region='North')
+        AppUser.objects.create_user('E1', 'pw', name='Seller One', position='Seller', region='North')
+        upload('a.xlsx', {'E1': 100})
+        self.client = client_for(manager)
+
+    def get(self, **headers):
+        response = self.client.get('/api/pdf/E1/', secure=True, **headers)
+        response.close()
+        return response
+
+    def test_not_modified_for_a_matching_etag(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        for header in [etag, f'W/{etag}', f'"other", {etag}', '*']:
+            self.assertEqual(self.get(HTTP_IF_NONE_MATCH=header).status_code, 304, header)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=f'"x{etag[1:]}').status_code, 200)
+
+    def test_new_etag_once_the_row_changes(self):
+        etag = self.get()['ETag']
+        upload('b.xlsx', {'E1': 250})
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+class UploadValidationTests(TempMediaMixin, TestCase):
+
+    def workbook(self, *sheets):
+        """
+        Saves (title, rows) sheets with the last tab selected, as a user may leave it.
+        """
+        workbook = Workbook()
+        workbook.remove(workbook.active)
+        for title, rows in sheets:
+            sheet = workbook.create_sheet(title)
+            for row in rows:
+                sheet.append(row)
+        workbook.active = len(sheets) - 1
+        path = os.path.join(self.media_root, 'book.xlsx')
+        workbook.save(path)
+        return path
+
+    def test_missing_columns_come_from_the_header(self):
+        path = self.workbook(('Data', [['Emp ID', 'Revenue'], ['E1', 10]]))
+        with self.assertRaises(UploadValidationError) as raised:
+            require_columns(path, PAYOUT_COLUMNS, PAYOUT_COLUMNS_MESSAGE)
+        self.assertEqual(raised.exception.errors[0]["error"], PAYOUT_COLUMNS_MESSAGE)
+        self.assertEqual(
+            raised.exception.errors[0]["missing_columns"],
+            [col for col in PAYOUT_COLUMNS if col not in ['Emp ID', 'Revenue']],
+        )
+
+    def test_bad_cells_are_reported_by_excel_row(self):
+        path = self.workbook(('Data', [['Emp ID', 'Revenue'], ['E1', 10], [None, 'ten'], ['E3', 5]]))
+        expected = [
+            {"row": 3, "column": "Emp ID", "error": "Value is required"},
+            {"row": 3, "column": "Revenue", "value": "ten", "error": "Expected a number"},
+        ]
+        for chunk_rows in [1, 100]:
+            with self.assertRaises(UploadValidationError) as raised:
+                read_validated_sheet(path, ['Revenue'], ['Emp ID'], chunk_rows=chunk_rows)
+            self.assertEqual(raised.exception.errors[0]["error_count"], 2)
+            self.assertEqual(raised.exception.errors[1:], expected)
+
+    def test_first_sheet_is_read_whichever_tab_is_active(self):
+        path = self.workbook(('Data', [['Emp ID', 'Revenue'], ['E1', 10]]), ('Notes', [['Comment'], ['x']]))
+        self.assertEqual(read_header(path), ['Emp ID', 'Revenue'])
+        df = read_validated_sheet(path, ['Revenue'], ['Emp ID'])
+        self.assertEqual(df.to_dict('records'), [{'Emp ID': 'E1', 'Revenue': 10}])
+
+class UpsertAOPTargetsTests(TestCase):
+
+    def aop_frame(self, rows):
+        return pd.DataFrame(rows, columns=['ShipTo', 'Emp ID', 'PY Actuals', 'Growth%', 'Region'])
+
+    def counts(self, result):
+        return {key: result[key] for key in ['inserted', 'updated', 'unchanged', 'deleted']}
+
+    def test_counts(self):
+        result = upsert_aop_targets(self.aop_frame([
+            ['S1', 'E1', 100, 10, 'North'],
+            ['S2', 'E1', 100, 10, 'North'],
+            ['S3', 'E2', 100, 10, 'South'],
+        ]))
+        self.assertEqual(self.counts(result), {'inserted': 3, 'updated': 0, 'unchanged': 0, 'deleted': 0})
+        unchanged_id = AOPTarget.objects.get(ship_to='S1').id
+
+        result = upsert_aop_targets(self.aop_frame([
+            ['S1', 'E1', 100, 10, 'North'],
+            ['S2', 'E1', 100, 20, 'North'],
+            ['S4', 'E3', 50, 0, 'South'],
+        ]))
+        self.assertEqual(self.counts(result), {'inserted': 1, 'updated': 1, 'unchanged': 1, 'deleted': 1})
+        self.assertEqual(sorted(AOPTarget.objects.values_list('ship_to', flat=True)), ['S1', 'S2', 'S4'])
+        self.assertEqual(AOPTarget.objects.get(ship_to='S1').id, unchanged_id)
+        self.assertAlmostEqual(AOPTarget.objects.get(ship_to='S2').target, 120.0)
+
+class NullTracker:
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ProvisionUsersTests(TestCase):
+
+    def provision(self, rows):
+        df = pd.DataFrame(rows, columns=['Employee ID', 'Position', 'Name', 'Password', 'Region'])
+        return provision_users(df, NullTracker())
+
+    def test_counts_and_position_changes(self):
+        counts, position_changes = self.provision([
+            ['E1', 'Seller', 'One', 'pw-one', 'North'],
+            ['E2', 'AM', 'Two', 'pw-two', 'North'],
+            ['E3', 'Intern', 'Three', 'pw-three', 'North'],
+        ])
+        self.assertEqual(counts, {
+            "created": 2, "updated": 0, "unchanged": 0, "skipped": 1, "passwords_rehashed": 2, "role_changes": 0,
+        })
+        self.assertEqual(sorted(position_changes), ['E1', 'E2'])
+
+        counts, position_changes = self.provision([
+            ['E1', 'Seller', 'One', 'pw-one', 'North'],
+            ['E2', 'DM', 'Two', 'pw-two', 'North'],
+            ['E4', 'Seller', 'Four', 'pw-four', 'South'],
+        ])
+        self.assertEqual(counts, {
+            "created": 1, "updated": 1, "unchanged": 1, "skipped": 0, "passwords_rehashed": 1, "role_changes": 1,
+        })
+        self.assertEqual(sorted(position_changes), ['E2', 'E4'])
+        promoted = AppUser.objects.get(employee_id='E2')
+        self.assertEqual((promoted.position, promoted.token_version), ('DM', 1))
+
+    def test_unchanged_passwords_are_not_rehashed(self):
+        self.provision([['E1', 'Seller', 'One', 'pw-one', 'North']])
+        encoded = AppUser.objects.get(employee_id='E1').password
+
+        counts, _ = self.provision([['E1', 'Seller', 'One', 'pw-one', 'North']])
+        self.assertEqual((counts["updated"], counts["passwords_rehashed"]), (0, 0))
+        self.assertEqual(AppUser.objects.get(employee_id='E1').password, encoded)
+
+        counts, position_changes = self.provision([['E1', 'Seller', 'One', 'pw-new', 'North']])
+        self.assertEqual((counts["updated"], counts["passwords_rehashed"], counts["role_changes"]), (1, 1, 0))
+        self.assertEqual(position_changes, [])
+        user = AppUser.objects.get(employee_id='E1')
+        self.assertTrue(user.check_password('pw-new'))
+        self.assertEqual(user.token_version, 0)
+
+class ClaimsJWTAuthenticationTests(TestCase):
+
+    def setUp(self):
+        token_versions.invalidate()
+        self.user = AppUser.objects.create_user('E1', 'pw', name='Seller One', position='Seller', region='North')
+
+    def authenticate(self, token):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return ClaimsJWTAuthentication().authenticate(request)
+
+    def test_rejects_token_after_version_bump(self):
+        token = issue_tokens(self.user).access_token
+        user, _ = self.authenticate(token)
+        self.assertEqual((user.employee_id, user.position), ('E1', 'Seller'))
+
+        # What an access import does on a role or region change
+        self.user.token_version += 1
+        self.user.save(update_fields=['token_version'])
+        token_versions.invalidate()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+        user, _ = self.authenticate(issue_tokens(self.user).access_token)
+        self.assertEqual(user.employee_id, 'E1')
+
+class AOPBatchEditTests(TestCase):
+
+    def setUp(self):
+        manager = AppUser.objects.create_user('DM1', 'pw', name='DM One', position='DM', region='North')
+        self.client = client_for(manager)
+        self.north = AOPTarget.objects.create(ship_to='S1', emp_id='E1', py_actuals=100, growth_percent=10, region='North')
+        self.other_north = AOPTarget.objects.create(ship_to='S2', emp_id='E2', py_actuals=100, growth_percent=10, region='North')
+        self.south = AOPTarget.objects.create(ship_to='S3', emp_id='E3', py_actuals=100, growth_percent=10, region='South')
+
+    def patch(self, edits):
+        return self.client.patch('/api/aop-targets/batch/', edits, format='json', secure=True)
+
+    def test_out_of_scope_and_invalid_edits_are_reported_and_skipped(self):
+        response = self.patch([
+            {'id': self.north.id, 'fields': {'growth_percent': 20}},
+            {'id': self.south.id, 'fields': {'growth_percent': 50}},
+            {'id': self.other_north.id, 'fields': {'py_actuals': 'lots'}},
+            {'id': 'S1', 'fields': {'growth_percent': 5}},
+            {'id': self.north.id},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['updated', 'not_found', 'invalid', 'invalid', 'invalid'])
+        self.assertEqual(response.data['updated'], 1)
+        self.assertAlmostEqual(results[0]['data']['target'], 120.0)
+        self.assertIn('py_actuals', results[2]['errors'])
+
+        self.assertAlmostEqual(AOPTarget.objects.get(pk=self.north.pk).target, 120.0)
+        self.assertEqual(AOPTarget.objects.get(pk=self.south.pk).growth_percent, 10)
+        self.assertEqual(AOPTarget.objects.get(pk=self.other_north.pk).py_actuals, 100)
+
+    def test_rejects_empty_and_oversized_batches(self):
+        self.assertEqual(self.patch([]).status_code, 400)
+        self.assertEqual(self.patch({'edits': 'all'}).status_code, 400)
+        edits = [{'id': self.north.id, 'fields': {'growth_percent': 1}}] * 1001
+        self.assertEqual(self.patch(edits).status_code, 400)
+        self.assertEqual(AOPTarget.objects.get(pk=self.north.pk).growth_percent, 10)
+
+class ConditionalOnTests(TestCase):
+
+    def setUp(self):
+        manager = AppUser.objects.create_user('DM1', 'pw', name='DM One', position='DM', region='North')
+        AppUser.objects.create_user('E1', 'pw', name='Seller One', position='Seller', region='North')
+        self.client = client_for(manager)
+        upload('a.xlsx', {'E1': 100})
+
+    def get(self, **headers):
+        return self.client.get('/api/summary/', secure=True, **headers)
+
+    def test_not_modified_until_new_upload(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=f'W/{etag}').status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='*').status_code, 304)
+
+        upload('b.xlsx', {'E1': 250})
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_modified_since(self):
+        last_modified = self.get()['Last-Modified']
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        earlier = (timezone.now() - timedelta(days=1)).timestamp()
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=http_date(earlier)).status_code, 200)
+
+class MetricsAuthTests(TestCase):
+
+    def setUp(self):
+        token_versions.invalidate()
+        self.staff = AppUser.objects.create_user('ADMIN', 'pw', name='Admin', position='DM', region='', is_staff=True)
+        self.seller = AppUser.objects.create_user('E1', 'pw', name='Seller One', position='Seller', region='North')
+
+    def get(self, credentials=None):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {credentials}'} if credentials else {}
+        return self.client.get('/metrics', secure=True, **headers)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_only_staff_without_a_metrics_token(self):
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(self.get('not-a-jwt').status_code, 403)
+        self.assertEqual(self.get(issue_tokens(self.seller).access_token).status_code, 403)
+        response = self.get(issue_tokens(self.staff).access_token)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_metrics_token(self):
+        self.assertEqual(self.get('scrape-secret').status_code, 200)
+        self.assertEqual(self.get('scrape-secre').status_code, 403)
+        self.assertEqual(self.get().status_code, 403)
+
+def workbook_bytes(df):
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+@override_settings(UPLOAD_JOBS_ASYNC=False)
+class DuplicateUploadTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        manager = AppUser.objects.create_user('DM1', 'pw', name='DM One', position='DM', region='North')
+        self.client = client_for(manager)
+        self.first = workbook_bytes(payout_frame_for({'E1': 100}))
+        self.second = workbook_bytes(payout_frame_for({'E1': 200}))
+
+    def post(self, content, name):
+        return self.client.post('/api/upload/', {'file': SimpleUploadedFile(name, content)}, format='multipart', secure=True)
+
+    def test_identical_latest_upload_is_not_processed_again(self):
+        response = self.post(self.first, 'a.xlsx')
+        self.assertEqual((response.status_code, response.data['status']), (202, 'succeeded'))
+        record = EmployeeData.objects.get()
+
+        response = self.post(self.first, 'a.xlsx')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['duplicate'])
+        self.assertEqual((response.data['upload_id'], response.data['row_count']), (record.pk, 1))
+        self.assertEqual(EmployeeData.objects.count(), 1)
+        self.assertEqual(UploadJob.objects.count(), 1)
+
+    def test_same_file_is_processed_once_something_newer_is_active(self):
+        self.post(self.first, 'a.xlsx')
+        self.post(self.second, 'b.xlsx')
+        response = self.post(self.first, 'a.xlsx')
+        self.assertEqual((response.status_code, response.data['status']), (202, 'succeeded'))
+        self.assertEqual(revenues(SIPPayout.objects.filter(is_current=True)), {'E1': 100})
+
+    def test_changed_file_supersedes_the_same_name(self):
+        self.post(self.first, 'a.xlsx')
+        self.post(self.second, 'a.xlsx')
+        self.assertEqual(EmployeeData.objects.filter(is_active=True).count(), 1)
+        self.assertEqual(revenues(SIPPayout.objects.filter(is_current=True)), {'E1': 200})
+
+class PayoutHistoryTests(TestCase):
+
+    def test_validity_follows_uploads_and_reuploads(self):
+        before = timezone.now()
+        first = upload('a.xlsx', {'E1': 100, 'E2': 100})
+        after_first = timezone.now()
+        upload('b.xlsx', {'E2': 200, 'E3': 200})
+        after_second = timezone.now()
+
+        original_e2 = SIPPayout.objects.get(upload=first, emp_id='E2')
+        self.assertFalse(original_e2.is_current)
+        self.assertIsNotNone(original_e2.valid_to)
+
+        # E2 goes back to a.xlsx: its old row is copied, not reopened
+        upload('b.xlsx', {'E3': 300})
+        reopened = SIPPayout.objects.get(emp_id='E2', is_current=True)
+        self.assertEqual(reopened.upload, first)
+        self.assertNotEqual(reopened.pk, original_e2.pk)
+        self.assertIsNone(reopened.valid_to)
+
+        self.assertEqual(revenues(payouts_as_of(before)), {})
+        self.assertEqual(revenues(payouts_as_of(after_first)), {'E1': 100, 'E2': 100})
+        self.assertEqual(revenues(payouts_as_of(after_second)), {'E1': 100, 'E2': 200, 'E3': 200})
+        self.assertEqual(revenues(payouts_as_of(timezone.now())), {'E1': 100, 'E2': 100, 'E3': 300})
+        for as_of in [after_first, after_second, timezone.now()]:
+            rows = payouts_as_of(as_of)
+            self.assertEqual(rows.count(), rows.values('emp_id').distinct().count())
+
+    def test_as_of_on_read_views(self):
+        manager = AppUser.objects.create_user('DM1', 'pw', name='DM One', position='DM', region='North')
+        AppUser.objects.create_user('E1', 'pw', name='Seller One', position='Seller', region='North')
+        client = client_for(manager)
+        upload('a.xlsx', {'E1': 100})
+        as_of = timezone.now().isoformat()
+        upload('b.xlsx', {'E1': 250})
+
+        response = client.get('/api/raw-data/totals/', {'as_of': as_of}, secure=True)
+        self.assertEqual(response.data['totals']['Revenue'], 100)
+        response = client.get('/api/raw-data/totals/', secure=True)
+        self.assertEqual(response.data['totals']['Revenue'], 250)
+        self.assertEqual(client.get('/api/raw-data/totals/', {'as_of': 'yesterday'}, secure=True).status_code, 400)
+
+@override_settings(UPLOAD_JOBS_ASYNC=False, COMPACT_AFTER_UPLOAD=False)
+class RetentionTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        manager = AppUser.objects.create_user('DM1', 'pw', name='DM One', position='DM', region='North')
+        self.client = client_for(manager)
+
+    def post(self, revenues, name):
+        content = SimpleUploadedFile(name, workbook_bytes(payout_frame_for(revenues)))
+        response = self.client.post('/api/upload/', {'file': content}, format='multipart', secure=True)
+        self.assertEqual(response.data['status'], 'succeeded')
+        return EmployeeData.objects.latest('uploaded_at')
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.media_root, name))
+
+    def media_file(self, name, age_seconds):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'x')
+        mtime = time.time() - age_seconds
+        os.utime(path, (mtime, mtime))
+
+    def sidecar(self, record):
+        return os.path.splitext(record.excel_file.name)[0] + '.parquet'
+
+    def test_prune_keeps_active_and_retained_uploads(self):
+        oldest = self.post({'E1': 100}, 'a.xlsx')
+        previous = self.post({'E1': 200}, 'a.xlsx')
+        active = self.post({'E1': 300}, 'a.xlsx')
+        self.media_file('access_uploads/stale.xlsx', ORPHAN_GRACE_SECONDS + 60)
+        self.media_file('access_uploads/fresh.xlsx', 0)
+
+        report = prune_media(keep_days=0, keep_inactive=1, dry_run=True)
+        self.assertEqual(report['uploads']['files'], 2)
+        self.assertTrue(self.exists(oldest.excel_file.name))
+
+        report = prune_media(keep_days=0, keep_inactive=1)
+        self.assertEqual((report['uploads']['files'], report['access_uploads']['files']), (2, 1))
+        self.assertFalse(self.exists(oldest.excel_file.name))
+        self.assertFalse(self.exists(self.sidecar(oldest)))
+        for record in [previous, active]:
+            self.assertTrue(self.exists(record.excel_file.name))
+            self.assertTrue(self.exists(self.sidecar(record)))
+        self.assertFalse(self.exists('access_uploads/stale.xlsx'))
+        self.assertTrue(self.exists('access_uploads/fresh.xlsx'))
+        # Only files go; payout history stays
+        self.assertEqual(SIPPayout.objects.filter(upload=oldest).count(), 1)
+
+    def test_compaction_is_read_in_place_of_its_uploads(self):
+        first = self.post({'E1': 100, 'E2': 100}, 'a.xlsx')
+        second = self.post({'E2': 200, 'E3': 200}, 'b.xlsx')
+        before = build_consolidated_data()
+
+        manifest = compact_uploads()
+        self.assertEqual(manifest['upload_ids'], sorted([first.pk, second.pk]))
+        self.assertEqual(read_compaction(), manifest)
+        self.assertTrue(self.exists(manifest['file']))
+        after = build_consolidated_data()
+        self.assertEqual(
+            dict(zip(after['Emp ID'], after['Revenue'])),
+            dict(zip(before['Emp ID'], before['Revenue'])),
+        )
+
+        prune_media(keep_days=0, keep_inactive=0)
+        self.assertTrue(self.exists(manifest['file']))
+        self.assertTrue(self.exists(first.excel_file.name))
+
+        # Superseding a covered upload means the compaction no longer applies
+        self.post({'E3': 300}, 'b.xlsx')
+        consolidated = build_consolidated_data()
+        self.assertEqual(dict(zip(consolidated['Emp ID'], consolidated['Revenue'])), {'E1': 100, 'E2': 100, 'E3': 300})
+
+@override_settings(UPLOAD_JOBS_ASYNC=False)
+class SellerRollupTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        manager = AppUser.objects.create_user('DM1', 'pw', name='DM One', position='DM', region='North')
+        for employee_id, region in [('E1', 'North'), ('E2', 'North'), ('E3', 'South'), ('E4', 'North')]:
+            AppUser.objects.create_user(employee_id, 'pw', name=f'Seller {employee_id}', position='Seller', region=region)
+        df = pd.concat([payout_frame_for({'E1': 100, 'E2': 200}), payout_frame_for({'E3': 300}, region='South')])
+        df.loc[df['Emp ID'] == 'E2', 'Revenue'] = None
+        content = SimpleUploadedFile('a.xlsx', workbook_bytes(df))
+        client_for(manager).post('/api/upload/', {'file': content}, format='multipart', secure=True)
+
+    def seller(self, employee_id):
+        return AppUser.objects.get(employee_id=employee_id)
+
+    def test_seller_slice_matches_a_cube_of_their_own_row(self):
+        frame = access_index_cache.get().frame
+        for employee_id in ['E1', 'E2', 'E3']:
+            seller = self.seller(employee_id)
+            own_row = RollupCube(frame[frame['Emp ID'] == employee_id]).slice(seller.region, ['Seller'])
+            self.assertEqual(get_rollup(seller), own_row, employee_id)
+
+        rollup = get_rollup(self.seller('E1'))
+        self.assertEqual((rollup['totals']['count'], rollup['totals']['Revenue']), (1, 100.0))
+        self.assertEqual([seller['Emp ID'] for seller in rollup['top_sellers']], ['E1'])
+
+    def test_no_slice_without_a_row_in_scope(self):
+        self.assertIsNone(get_rollup(self.seller('E4')))
+        moved = self.seller('E1')
+        moved.region = 'South'
+        self.assertIsNone(get_rollup(moved))
+        self.assertEqual(client_for(self.seller('E4')).get('/api/rollup/', secure=True).status_code, 404)
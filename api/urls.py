@@ -1,16 +1,24 @@
 from django.urls import path
-from .views import UploadExcelView, RawDataView, SummaryView, GeneratePDFView, LatestFileView, AOPTargetUploadView, AOPTargetListView, AOPTargetUpdateView, AccessFileUploadView, LoginView, CreateSuperuserView
+from .views import UploadExcelView, RawDataView, SummaryView, GeneratePDFView, LatestFileView, AOPTargetUploadView, AOPTargetListView, AOPTargetUpdateView, AccessFileUploadView, LoginView, CreateSuperuserView, CacheStatsView, RawDataTotalsView, BulkPDFView, UploadJobView, AOPTargetBatchUpdateView, AttainmentView, RollupView
 from rest_framework_simplejwt.views import TokenRefreshView
+from .async_views import read_view
 
 
 urlpatterns = [
     path('upload/', UploadExcelView.as_view(), name='upload'),
-    path('raw-data/', RawDataView.as_view(), name='raw-data'),
-    path('summary/', SummaryView.as_view(), name='summary'),
-    path('pdf/<str:emp_id>/', GeneratePDFView.as_view(), name='generate-pdf'),
-    path('latest-file/', LatestFileView.as_view(), name='latest-file'),
+    path('jobs/<int:id>/', UploadJobView.as_view(), name='upload-job'),
+    path('raw-data/', read_view(RawDataView, 'heavy'), name='raw-data'),
+    path('raw-data/totals/', RawDataTotalsView.as_view(), name='raw-data-totals'),
+    path('summary/', read_view(SummaryView, 'light'), name='summary'),
+    path('rollup/', read_view(RollupView, 'light'), name='rollup'),
+    path('attainment/', read_view(AttainmentView, 'heavy'), name='attainment'),
+    path('pdf/bulk/', BulkPDFView.as_view(), name='generate-pdf-bulk'),
+    path('pdf/<str:emp_id>/', read_view(GeneratePDFView, 'heavy'), name='generate-pdf'),
+    path('cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('latest-file/', read_view(LatestFileView, 'light'), name='latest-file'),
     path('aop-targets/upload/', AOPTargetUploadView.as_view(), name='aop-target-upload'),
     path('aop-targets/', AOPTargetListView.as_view(), name='aop-target-list'),
+    path('aop-targets/batch/', AOPTargetBatchUpdateView.as_view(), name='aop-target-batch-update'),
     path('aop-targets/<int:id>/', AOPTargetUpdateView.as_view(), name='aop-target-update'),
     path('access-file/upload/', AccessFileUploadView.as_view(), name='access-file-upload'),
     path('login/', LoginView.as_view(), name='login'),
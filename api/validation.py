@@ -0,0 +1,138 @@
+CHUNK_ROWS = 5000
+MAX_REPORTED_ERRORS = 200
+
+
+class UploadValidationError(Exception):
+    """
+    Raised when an uploaded file itself is wrong; carries a structured error
+    list (one entry per problem, with row/column where known).
+    """
+
+    def __init__(self, errors):
+        super().__init__(errors[0]["error"] if errors else "Invalid upload")
+        self.errors = errors
+
+
+def _open_sheet(file_path):
+    from openpyxl import load_workbook
+
+    try:
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+    except Exception as e:
+        raise UploadValidationError([{"error": f"Could not read workbook: {e}"}])
+    # The first sheet, as pd.read_excel() reads; workbook.active is whichever tab was last selected
+    return workbook, workbook.worksheets[0]
+
+
+def _header_names(header_row):
+    return [str(value).strip() if value is not None else f"Unnamed: {i}" for i, value in enumerate(header_row)]
+
+
+def read_header(file_path):
+    """
+    Column names from the first row only; nothing else is parsed.
+    """
+    workbook, sheet = _open_sheet(file_path)
+    try:
+        header_row = next(sheet.iter_rows(min_row=1, max_row=1, values_only=True), ())
+        return _header_names(header_row)
+    finally:
+        workbook.close()
+
+
+def require_columns(file_path, expected, message):
+    """
+    Fails fast with message when the header lacks any expected column.
+    """
+    header = read_header(file_path)
+    missing = [col for col in expected if col not in header]
+    if missing:
+        raise UploadValidationError([{"error": message, "missing_columns": missing}])
+    return header
+
+
+def iter_sheet_chunks(file_path, chunk_rows=CHUNK_ROWS):
+    """
+    Streams the sheet in read-only mode, yielding (excel_row_numbers, DataFrame)
+    per chunk so only one chunk of cells is in memory at a time.
+    """
+    import pandas as pd
+
+    workbook, sheet = _open_sheet(file_path)
+    try:
+        rows = sheet.iter_rows(values_only=True)
+        header = _header_names(next(rows, ()))
+        chunk = []
+        row_numbers = []
+        for excel_row, values in enumerate(rows, start=2):
+            if all(value is None for value in values):
+                continue
+            row_numbers.append(excel_row)
+            chunk.append(values[:len(header)] + (None,) * (len(header) - len(values)))
+            if len(chunk) >= chunk_rows:
+                yield row_numbers, pd.DataFrame.from_records(chunk, columns=header)
+                chunk = []
+                row_numbers = []
+        if chunk:
+            yield row_numbers, pd.DataFrame.from_records(chunk, columns=header)
+    finally:
+        workbook.close()
+
+
+def _blank(series):
+    return series.isna() | (series.astype(str).str.strip() == '')
+
+
+def check_chunk(df, row_numbers, numeric_columns=(), required_columns=()):
+    """
+    Vectorised per-row checks; returns one error dict per bad cell.
+    Rows are reported with their Excel row number.
+    """
+    import pandas as pd
+
+    errors = []
+    excel_rows = pd.Series(row_numbers, index=df.index)
+    for col in required_columns:
+        for row in excel_rows[_blank(df[col])]:
+            errors.append({"row": int(row), "column": col, "error": "Value is required"})
+    for col in numeric_columns:
+        coerced = pd.to_numeric(df[col], errors='coerce')
+        bad = coerced.isna() & ~_blank(df[col])
+        for idx in df.index[bad]:
+            errors.append({
+                "row": int(excel_rows[idx]),
+                "column": col,
+                "value": str(df.at[idx, col]),
+                "error": "Expected a number"
+            })
+    return errors
+
+
+def read_validated_sheet(file_path, numeric_columns=(), required_columns=(), chunk_rows=CHUNK_ROWS):
+    """
+    Parses the sheet chunk by chunk, type-checking as it goes, and returns
+    the rows with numeric columns as numbers. Raises UploadValidationError
+    with a per-row report if any cell is invalid.
+    """
+    import pandas as pd
+
+    chunks = []
+    errors = []
+    error_count = 0
+    for row_numbers, chunk in iter_sheet_chunks(file_path, chunk_rows):
+        chunk_errors = check_chunk(chunk, row_numbers, numeric_columns, required_columns)
+        error_count += len(chunk_errors)
+        errors.extend(chunk_errors[:MAX_REPORTED_ERRORS - len(errors)])
+        if not error_count:
+            chunks.append(chunk)
+    if error_count:
+        summary = {"error": f"{error_count} invalid cell(s) found", "error_count": error_count}
+        if error_count > len(errors):
+            summary["truncated"] = True
+        raise UploadValidationError([summary] + errors)
+    if not chunks:
+        return pd.DataFrame(columns=read_header(file_path))
+    df = pd.concat(chunks, ignore_index=True).infer_objects()
+    for col in numeric_columns:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
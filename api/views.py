@@ -1,105 +1,103 @@
-import pandas as pd
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics
 from django.core.files.storage import FileSystemStorage
 import os
+import binascii
+import time
+from datetime import datetime, time as datetime_time
 from django.conf import settings
-from .models import EmployeeData, AOPTarget, AppUser
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from io import BytesIO
-from django.http import FileResponse
-from .serializers import AOPTargetSerializer
-from rest_framework_simplejwt.tokens import RefreshToken
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import EmployeeData, AOPTarget, AppUser, SIPPayout, UploadJob
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from .serializers import AOPTargetListSerializer, AOPTargetSerializer, sparse_fields
+from .pagination import AOPTargetCursorPagination
+from .renderers import ColumnarJSONRenderer
+from .access import access_index_cache
+from .aop import aop_targets_for_user, apply_batch_edits
+from .attainment import attainment_cache, get_attainment
+from .rollups import get_rollup, rollup_cache
+from .conditional import conditional_on, etag_listed
+from .metrics import render_metrics
+from .jobs import enqueue_upload
+from .async_views import streaming_response
+from .ingest import identical_upload_result, PAYOUT_COLUMNS, AOP_COLUMNS, ACCESS_COLUMNS, PAYOUT_COLUMNS_MESSAGE, AOP_COLUMNS_MESSAGE, ACCESS_COLUMNS_MESSAGE
+from .validation import UploadValidationError, require_columns
+from .consolidation import consolidated_cache, find_identical_upload, upload_checksum
+from .pdf import get_cached_payslip, render_merged_payslips, stream_payslip_zip
+from .payouts import payouts_for_user, payout_frame, payout_records, payout_totals, payout_summary, payout_page, PAYOUT_STREAM_FORMATS
+from django.urls import reverse
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework.settings import api_settings
+from .authentication import ClaimsJWTAuthentication, issue_tokens
 from rest_framework.permissions import AllowAny
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.pdfgen import canvas
-from reportlab.platypus import Table, TableStyle
+from rest_framework.exceptions import AuthenticationFailed
+from django.utils.crypto import constant_time_compare
+from django.utils.http import parse_etags
 from io import BytesIO
-from datetime import datetime
 from django.contrib.auth import get_user_model
 
 
+RAW_DATA_PAGE_SIZE = 100
+RAW_DATA_MAX_PAGE_SIZE = 1000
+AOP_BATCH_MAX_EDITS = 1000
 
-ROLE_HIERARCHY = {
-    'DM': ['DM', 'AM', 'Seller'],
-    'AM': ['AM', 'Seller'],
-    'Seller': ['Seller'],
-}
-
-def filter_data_by_user_role(df, user):
-    # Normalize Emp IDs in dataframe to string and strip whitespace
-    df['Emp ID'] = df['Emp ID'].astype(str).str.strip()
-
-    # Get unique Emp IDs after normalization
-    emp_ids = df['Emp ID'].unique().tolist()
-
-    # Query AppUser and normalize employee IDs keys similarly
-    app_user_qs = AppUser.objects.filter(employee_id__in=emp_ids).values('employee_id', 'position')
-    emp_position_map = {str(u['employee_id']).strip(): u['position'] for u in app_user_qs}
-
-    # Map positions without defaulting to 'Seller' here
-    df.loc[:, 'Position'] = df['Emp ID'].map(emp_position_map)
-
-    # Log unmapped Emp IDs for debugging
-    unmapped = df[df['Position'].isna()]['Emp ID'].unique()
-    if len(unmapped) > 0:
-        print(f"Warning: Emp IDs with no position mapping: {unmapped}")
-
-    # Fill missing positions with a neutral value or leave as NaN
-    df['Position'] = df['Position'].fillna('Unknown')
-
-    # Filter by user region (case-insensitive)
-    if user.region:
-        df = df[df['Region'].astype(str).str.strip().str.lower() == user.region.lower().strip()]
-
-    # Filter by allowed roles in the hierarchy
-    allowed_positions = ROLE_HIERARCHY.get(user.position, [])
-    df = df[df['Position'].isin(allowed_positions)]
-
-    # If user is Seller, restrict further to own Emp ID
-    if user.position == 'Seller':
-        df = df[df['Emp ID'] == str(user.employee_id).strip()]
-
-    return df
+def get_consolidated_data():
+    """
+    Consolidated DataFrame of all active uploads, served from the
+    per-process cache. Treat the returned frame as read-only.
+    """
+    return consolidated_cache.get()
 
+def save_upload(uploaded_file, subdir):
+    """
+    Stores the raw upload under MEDIA_ROOT/<subdir> and returns its relative path.
+    """
+    fs = FileSystemStorage(location=os.path.join(settings.MEDIA_ROOT, subdir))
+    filename = fs.save(uploaded_file.name, uploaded_file)
+    return os.path.join(subdir, filename)
 
-def get_consolidated_data():
+def reject_bad_header(file_path, columns, message):
     """
-    Reads and consolidates active Excel files into one DataFrame,
-    keeping latest record per Emp ID.
-    No filtering done here; filtering to be done separately.
+    Reads only the header row so a wrong file is refused before it is queued.
+    Returns a 400 response (and deletes the file) or None if the header is fine.
     """
-    active_files = EmployeeData.objects.filter(is_active=True).order_by('-uploaded_at')
-    dfs = []
-    for record in active_files:
-        try:
-            file_path = os.path.normpath(os.path.join(settings.MEDIA_ROOT, record.excel_file.name))
-            if os.path.exists(file_path):
-                df = pd.read_excel(file_path)
-                df['_uploaded_at'] = record.uploaded_at
-                dfs.append(df)
-        except Exception as e:
-            print(f"Error reading file {record.excel_file.name}: {e}")
-            continue
-
-    if dfs:
-        consolidated_df = (
-            pd.concat(dfs)
-            .sort_values('_uploaded_at', ascending=False)
-            .drop_duplicates(subset=['Emp ID'], keep='first')
-            .drop(columns=['_uploaded_at'])
-        )
-        return consolidated_df
-    return pd.DataFrame()
+    full_path = os.path.join(settings.MEDIA_ROOT, file_path)
+    try:
+        require_columns(full_path, columns, message)
+    except UploadValidationError as e:
+        os.remove(full_path)
+        return Response({"error": str(e), "errors": e.errors}, status=status.HTTP_400_BAD_REQUEST)
+    return None
+
+def parse_as_of(value):
+    """
+    ?as_of= as an aware datetime. Takes an ISO timestamp, or a date meaning the
+    end of that day; naive values are in the server time zone.
+    Raises ValueError if it is neither.
+    """
+    as_of = parse_datetime(value)
+    if as_of is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        as_of = datetime.combine(day, datetime_time.max)
+    if timezone.is_naive(as_of):
+        as_of = timezone.make_aware(as_of)
+    return as_of
+
+def job_accepted_response(job):
+    return Response({
+        "success": True,
+        "message": "File accepted for processing",
+        "job_id": job.pk,
+        "status": job.status,
+        "status_url": reverse('upload-job', args=[job.pk])
+    }, status=status.HTTP_202_ACCEPTED)
 
 class UploadExcelView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -109,33 +107,85 @@ class UploadExcelView(APIView):
         if not uploaded_file.name.endswith('.xlsx'):
             return Response({"error": "Invalid file type. Only .xlsx allowed"}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            fs = FileSystemStorage(location=os.path.join(settings.MEDIA_ROOT, 'uploads'))
-            EmployeeData.objects.filter(excel_file__endswith=uploaded_file.name).update(is_active=False)
-            filename = fs.save(uploaded_file.name, uploaded_file)
-            file_path = os.path.join(settings.MEDIA_ROOT, 'uploads', filename)
-            df = pd.read_excel(file_path)
-            EXPECTED_COLUMNS = ["Emp ID", "Emp Name", "Region", "Revenue", "GP", "SIP Payout Amount", "Approval", "SIP Paid"]
-            if not all(col in df.columns for col in EXPECTED_COLUMNS):
-                fs.delete(filename)
-                return Response({"error": f"Missing columns. Expected: {EXPECTED_COLUMNS}"}, status=status.HTTP_400_BAD_REQUEST)
-            EmployeeData.objects.create(
-                excel_file=os.path.join('uploads', filename),
-                is_active=True
-            )
-            consolidated_df = get_consolidated_data()
-            filtered_df = filter_data_by_user_role(consolidated_df, request.user)
-            return Response({
-                "success": True,
-                "message": "File processed successfully",
-                "employee_count": filtered_df.shape[0]
-            }, status=status.HTTP_200_OK)
+            # Hashed from the upload's chunks before anything is stored or parsed
+            identical = find_identical_upload(upload_checksum(uploaded_file.chunks()), uploaded_file.name)
+            if identical is not None:
+                return Response({"success": True, **identical_upload_result(identical)}, status=status.HTTP_200_OK)
+            file_path = save_upload(uploaded_file, 'uploads')
+            rejected = reject_bad_header(file_path, PAYOUT_COLUMNS, PAYOUT_COLUMNS_MESSAGE)
+            if rejected:
+                return rejected
+            job = enqueue_upload('payout', file_path, uploaded_file.name, request.user)
+            return job_accepted_response(job)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class UploadJobView(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, id):
+        job = UploadJob.objects.filter(pk=id).first()
+        if job is None or (job.submitted_by_id != request.user.pk and not request.user.is_staff):
+            return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            "id": job.pk,
+            "kind": job.kind,
+            "status": job.status,
+            "stage": job.stage,
+            "progress": job.progress,
+            "file": job.original_name,
+            "row_count": job.row_count,
+            "errors": job.errors,
+            "timings": job.timings,
+            "result": job.result,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+        }, status=status.HTTP_200_OK)
+
+class CacheStatsView(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({
+            "consolidated_data": consolidated_cache.stats(),
+            "access_index": access_index_cache.stats(),
+            "attainment": attainment_cache.stats(),
+            "rollup": rollup_cache.stats(),
+        }, status=status.HTTP_200_OK)
+
+class MetricsView(APIView):
+    """
+    Prometheus text exposition of this process's request metrics. Needs
+    "Authorization: Bearer <METRICS_TOKEN>" or a staff user's access token;
+    with neither configured nothing is exposed.
+    """
+    # The metrics token is not a JWT, so credentials are checked in get()
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def allowed(self, request):
+        header = request.headers.get('Authorization', '')
+        if settings.METRICS_TOKEN and constant_time_compare(header, f"Bearer {settings.METRICS_TOKEN}"):
+            return True
+        try:
+            authenticated = ClaimsJWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return authenticated is not None and authenticated[0].is_staff
+
+    def get(self, request):
+        if not self.allowed(request):
+            return Response({"error": "Metrics need the metrics token or a staff login"}, status=status.HTTP_403_FORBIDDEN)
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 class LatestFileView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
+    @conditional_on('data')
     def get(self, request):
         latest_file = EmployeeData.objects.filter(is_active=True).order_by('-uploaded_at').first()
         if not latest_file:
@@ -146,140 +196,214 @@ class LatestFileView(APIView):
         })
 
 class RawDataView(APIView):
-    authentication_classes = [JWTAuthentication]
+    """
+    Full scoped dataset by default. ?page_size=/&cursor= switches to keyset
+    pages ordered by Emp ID, ?stream=ndjson|csv streams rows in chunks.
+    Paged and streamed responses leave totals to RawDataTotalsView.
+    ?format=columnar (or its Accept type) returns "data" as columns + row arrays.
+    ?as_of=<timestamp or date> answers from payout history as consolidated then.
+    """
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [ColumnarJSONRenderer]
 
+    @conditional_on('data', 'access')
     def get(self, request):
         try:
             user = request.user
-            df = get_consolidated_data()
-            if df.empty:
+            try:
+                as_of = parse_as_of(request.query_params['as_of']) if 'as_of' in request.query_params else None
+            except ValueError:
+                return Response({"error": "Invalid as_of. Use an ISO timestamp or date"}, status=status.HTTP_400_BAD_REQUEST)
+            if as_of is None and not SIPPayout.objects.filter(is_current=True).exists():
                 return Response({"error": "No active data available"}, status=status.HTTP_404_NOT_FOUND)
-            filtered_df = filter_data_by_user_role(df, user)
-            if filtered_df.empty:
+            qs = payouts_for_user(user, as_of).order_by('emp_id')
+            columnar = request.accepted_renderer.format == ColumnarJSONRenderer.format
+
+            stream_format = request.query_params.get('stream')
+            if stream_format:
+                if stream_format not in PAYOUT_STREAM_FORMATS:
+                    return Response({"error": f"Unsupported stream format. Use one of: {list(PAYOUT_STREAM_FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+                if not qs.exists():
+                    return Response({"error": "No data available for your permissions"}, status=status.HTTP_404_NOT_FOUND)
+                stream, content_type = PAYOUT_STREAM_FORMATS[stream_format]
+                response = streaming_response(request, stream(qs), content_type=content_type)
+                if stream_format == 'csv':
+                    response['Content-Disposition'] = 'attachment; filename="raw_data.csv"'
+                return response
+
+            if 'page_size' in request.query_params or 'cursor' in request.query_params:
+                cursor = request.query_params.get('cursor')
+                try:
+                    page_size = int(request.query_params.get('page_size', RAW_DATA_PAGE_SIZE))
+                    records, next_cursor = payout_page(qs, cursor, max(1, min(page_size, RAW_DATA_MAX_PAGE_SIZE)), as_frame=columnar)
+                except (ValueError, UnicodeDecodeError, binascii.Error):
+                    return Response({"error": "Invalid page_size or cursor"}, status=status.HTTP_400_BAD_REQUEST)
+                if not len(records) and not cursor:
+                    return Response({"error": "No data available for your permissions"}, status=status.HTTP_404_NOT_FOUND)
+                return Response({
+                    "data": records,
+                    "next_cursor": next_cursor
+                }, status=status.HTTP_200_OK)
+
+            records = payout_frame(qs) if columnar else payout_records(qs)
+            if not len(records):
+                return Response({"error": "No data available for your permissions"}, status=status.HTTP_404_NOT_FOUND)
+            return Response({
+                "data": records,
+                "totals": payout_totals(qs)
+            }, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class RawDataTotalsView(APIView):
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            try:
+                as_of = parse_as_of(request.query_params['as_of']) if 'as_of' in request.query_params else None
+            except ValueError:
+                return Response({"error": "Invalid as_of. Use an ISO timestamp or date"}, status=status.HTTP_400_BAD_REQUEST)
+            qs = payouts_for_user(request.user, as_of)
+            if not qs.exists():
                 return Response({"error": "No data available for your permissions"}, status=status.HTTP_404_NOT_FOUND)
-            totals = {
-                "Revenue": filtered_df["Revenue"].sum(),
-                "GP": filtered_df["GP"].sum(),
-                "SIP Payout Amount": filtered_df["SIP Payout Amount"].sum()
-            }
             return Response({
-                "data": filtered_df.to_dict('records'),
-                "totals": totals
+                "totals": payout_totals(qs),
+                "count": qs.count()
             }, status=status.HTTP_200_OK)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class SummaryView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
+    @conditional_on('data', 'access')
     def get(self, request):
         try:
             user = request.user
-            df = get_consolidated_data()
-            if df.empty:
+            try:
+                as_of = parse_as_of(request.query_params['as_of']) if 'as_of' in request.query_params else None
+            except ValueError:
+                return Response({"error": "Invalid as_of. Use an ISO timestamp or date"}, status=status.HTTP_400_BAD_REQUEST)
+            if as_of is None and not SIPPayout.objects.filter(is_current=True).exists():
                 return Response({"error": "No active data available"}, status=status.HTTP_404_NOT_FOUND)
-            filtered_df = filter_data_by_user_role(df, user)
-            if filtered_df.empty:
+            summary = payout_summary(payouts_for_user(user, as_of))
+            if summary is None:
                 return Response({"error": "No data available for your permissions"}, status=status.HTTP_404_NOT_FOUND)
+            return Response(summary, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-            paid_rows = filtered_df[filtered_df["SIP Paid"] == "Yes"]
-            pending = filtered_df[filtered_df["Approval"] == "Not yet"].shape[0]
-            total_rows = filtered_df.shape[0]
-            success_rate = round((paid_rows.shape[0] / total_rows) * 100, 2) if total_rows > 0 else 0
+class RollupView(APIView):
+    """
+    Payout totals and breakdowns by region, position, approval and SIP Paid,
+    plus top sellers, sliced from the cached rollup cube to the caller's scope.
+    """
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
 
-            return Response({
-                "paid_total": paid_rows["SIP Payout Amount"].sum(),
-                "pending_approvals": pending,
-                "success_rate": success_rate
-            }, status=status.HTTP_200_OK)
+    @conditional_on('data', 'access')
+    def get(self, request):
+        try:
+            rollup = get_rollup(request.user)
+            if rollup is None:
+                return Response({"error": "No data available for your permissions"}, status=status.HTTP_404_NOT_FOUND)
+            return Response(rollup, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class AttainmentView(APIView):
+    """
+    AOP target vs. consolidated Revenue/GP per Emp ID in the caller's scope,
+    with attainment %, gap to target and rank (1 = highest attainment).
+    """
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @conditional_on('data', 'aop', 'access')
+    def get(self, request):
+        try:
+            report = get_attainment(request.user)
+            if not report["data"]:
+                return Response({"error": "No data available for your permissions"}, status=status.HTTP_404_NOT_FOUND)
+            return Response(report, status=status.HTTP_200_OK)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class GeneratePDFView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request, emp_id):
         try:
             user = request.user
-            df = get_consolidated_data()
-            if df.empty:
+            if not SIPPayout.objects.filter(is_current=True).exists():
                 return Response({"error": "No active data available"}, status=status.HTTP_404_NOT_FOUND)
-            filtered_df = filter_data_by_user_role(df, user)
-            if filtered_df.empty:
+            qs = payouts_for_user(user)
+            if not qs.exists():
                 return Response({"error": "Access denied or data not found"}, status=status.HTTP_403_FORBIDDEN)
 
-            try:
-                employee = filtered_df[filtered_df["Emp ID"] == emp_id].iloc[0]
-            except (IndexError, ValueError):
+            records = payout_records(qs.filter(emp_id=str(emp_id).strip()))
+            if not records:
                 return Response({"error": "Invalid Employee ID or Access denied"}, status=status.HTTP_404_NOT_FOUND)
+            employee = records[0]
+
+            etag, path = get_cached_payslip(employee)
+            quoted_etag = f'"{etag}"'
+            tags = parse_etags(request.headers.get('If-None-Match', ''))
+            if '*' in tags or etag_listed(tags, quoted_etag):
+                response = HttpResponseNotModified()
+            else:
+                response = FileResponse(open(path, 'rb'), as_attachment=True, filename=f"sip_slip_{emp_id}.pdf", content_type='application/pdf')
+            response['ETag'] = quoted_etag
+            response['Cache-Control'] = 'private, no-cache'
+            return response
+
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-            buffer = BytesIO()
-            p = canvas.Canvas(buffer, pagesize=letter)
-            width, height = letter
-
-            # Margins
-            margin = inch  # 72 points = 1 inch
-
-            # Title
-            p.setFont("Helvetica-Bold", 18)
-            p.drawCentredString(width / 2, height - margin + 10, "EMPLOYEE SIP PAYOUT SLIP")
-
-            # Separator line below title
-            p.setStrokeColor(colors.grey)
-            p.setLineWidth(1)
-            p.line(margin, height - margin, width - margin, height - margin)
-
-            # Employee info table data (label and value pairs)
-            data = [
-                ['Employee ID:', str(employee["Emp ID"])],
-                ['Name:', employee.get("Emp Name", "")],
-                ['Position:', employee.get("Position", "N/A")],
-                ['Region:', employee.get("Region", "")],
-                ['SIP Payout Amount:', f"${employee['SIP Payout Amount']:,.2f}"],
-            ]
-
-            # Create table with 2 columns: label and value
-            table = Table(data, colWidths=[2*inch, width - 2*margin - 2*inch])
-            style = TableStyle([
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 12),
-                ('ALIGN', (0, 0), (0, -1), 'RIGHT'),  # Right align labels
-                ('ALIGN', (1, 0), (1, -1), 'LEFT'),   # Left align values
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                ('TOPPADDING', (0, 0), (-1, -1), 8),
-                ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#f2f2f2")),
-            ])
-            table.setStyle(style)
-
-            # Position table on the page below the title
-            table_width, table_height = table.wrap(0, 0)
-            table.drawOn(p, margin, height - margin - 30 - table_height)
-
-            # Footer with generation date and page number
-            p.setFont("Helvetica-Oblique", 8)
-            p.setFillColor(colors.grey)
-            footer_text = f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-            p.drawString(margin, margin / 2, footer_text)
-            p.drawRightString(width - margin, margin / 2, "Page 1")
-
-            p.showPage()
-            p.save()
-            buffer.seek(0)
-
-            return FileResponse(buffer, as_attachment=True, filename=f"sip_slip_{emp_id}.pdf", content_type='application/pdf')
 
+class BulkPDFView(APIView):
+    """
+    Every slip in the caller's scope, either as a ZIP streamed while slips are
+    rendered across a bounded process pool (default) or as one merged PDF
+    (?output=pdf).
+    """
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            if not SIPPayout.objects.filter(is_current=True).exists():
+                return Response({"error": "No active data available"}, status=status.HTTP_404_NOT_FOUND)
+            employees = payout_records(payouts_for_user(request.user).order_by('emp_id'))
+            if not employees:
+                return Response({"error": "Access denied or data not found"}, status=status.HTTP_403_FORBIDDEN)
+
+            output = request.query_params.get('output', 'zip')
+            if output == 'pdf':
+                started = time.perf_counter()
+                buffer = BytesIO(render_merged_payslips(employees))
+                elapsed = time.perf_counter() - started
+                response = FileResponse(buffer, as_attachment=True, filename="sip_slips.pdf", content_type='application/pdf')
+                response['X-Slips-Per-Second'] = f"{len(employees) / elapsed:.2f}" if elapsed > 0 else "0"
+                return response
+            if output != 'zip':
+                return Response({"error": "output must be 'zip' or 'pdf'"}, status=status.HTTP_400_BAD_REQUEST)
+
+            response = streaming_response(request, stream_payslip_zip(employees), content_type='application/zip')
+            response['Content-Disposition'] = 'attachment; filename="sip_slips.zip"'
+            response['X-Slip-Count'] = str(len(employees))
+            return response
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
 class AOPTargetUploadView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -289,72 +413,72 @@ class AOPTargetUploadView(APIView):
         if not excel_file.name.endswith('.xlsx'):
             return Response({"error": "Only '.xlsx' files allowed"}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            fs = FileSystemStorage(location=os.path.join(settings.MEDIA_ROOT, 'aop_uploads'))
-            filename = fs.save(excel_file.name, excel_file)
-            file_path = os.path.join(settings.MEDIA_ROOT, 'aop_uploads', filename)
-            expected_cols = ['ShipTo', 'PY Actuals', 'Growth%', 'Region', 'Emp ID']
-            df = pd.read_excel(file_path)
-            if not all(col in df.columns for col in expected_cols):
-                fs.delete(filename)
-                return Response({"error": f"Excel must contain columns: {expected_cols}"}, status=status.HTTP_400_BAD_REQUEST)
-            AOPTarget.objects.all().delete()
-            objs = []
-            for _, row in df.iterrows():
-                py_actuals = row['PY Actuals']
-                growth_percent = row['Growth%'] if not pd.isna(row['Growth%']) else 0
-                target = py_actuals * (1 + growth_percent / 100)
-                obj = AOPTarget(
-                    ship_to=row['ShipTo'],
-                    py_actuals=py_actuals,
-                    growth_percent=growth_percent,
-                    target=target,
-                    region=row['Region'],
-                    emp_id=str(row['Emp ID']).strip() if 'Emp ID' in row else None
-                )
-                objs.append(obj)
-            AOPTarget.objects.bulk_create(objs)
-            fs.delete(filename)
-            return Response({"success": True, "message": "File uploaded and data saved."}, status=status.HTTP_200_OK)
+            file_path = save_upload(excel_file, 'aop_uploads')
+            rejected = reject_bad_header(file_path, AOP_COLUMNS, AOP_COLUMNS_MESSAGE)
+            if rejected:
+                return rejected
+            job = enqueue_upload('aop', file_path, excel_file.name, request.user)
+            return job_accepted_response(job)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class AOPTargetListView(generics.ListAPIView):
-    serializer_class = AOPTargetSerializer
-    authentication_classes = [JWTAuthentication]
+    """
+    ?page_size= turns on cursor pagination; ?fields=a,b limits the columns
+    both in the SELECT and in the response.
+    """
+    serializer_class = AOPTargetListSerializer
+    pagination_class = AOPTargetCursorPagination
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
+    @conditional_on('aop')
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
-        user = self.request.user
-        qs = AOPTarget.objects.all()
-        if user.position in ['DM', 'AM']:
-            qs = qs.filter(region=user.region)
-        elif user.position == 'Seller':
-            qs = qs.filter(emp_id=user.employee_id)
-        else:
-            qs = qs.none()
+        qs = aop_targets_for_user(self.request.user)
+        fields = sparse_fields(self.request, AOPTarget)
+        if fields:
+            qs = qs.only('id', *fields)
         return qs
 
 class AOPTargetUpdateView(generics.UpdateAPIView):
     queryset = AOPTarget.objects.all()
     serializer_class = AOPTargetSerializer
     lookup_field = 'id'
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        qs = super().get_queryset()
-        if user.position in ['DM', 'AM']:
-            qs = qs.filter(region=user.region)
-        elif user.position == 'Seller':
-            qs = qs.filter(emp_id=user.employee_id)
-        else:
-            qs = qs.none()
-        return qs
+        return aop_targets_for_user(self.request.user, super().get_queryset())
+
+class AOPTargetBatchUpdateView(APIView):
+    """
+    PATCH a list of {"id": ..., "fields": {...}} edits (or {"edits": [...]}).
+    Valid edits are applied together; every edit gets its own result.
+    """
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def patch(self, request):
+        edits = request.data.get('edits') if isinstance(request.data, dict) else request.data
+        if not isinstance(edits, list) or not edits:
+            return Response({"error": "Expected a non-empty list of edits"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(edits) > AOP_BATCH_MAX_EDITS:
+            return Response({"error": f"At most {AOP_BATCH_MAX_EDITS} edits per request"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            results = apply_batch_edits(request.user, edits, AOPTargetSerializer)
+            return Response({
+                "updated": sum(1 for r in results if r["status"] == "updated"),
+                "results": results
+            }, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
 class AccessFileUploadView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -364,34 +488,18 @@ class AccessFileUploadView(APIView):
         if not excel_file.name.endswith('.xlsx'):
             return Response({"error": "Only '.xlsx' files allowed"}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            fs = FileSystemStorage(location=os.path.join(settings.MEDIA_ROOT, 'access_uploads'))
-            filename = fs.save(excel_file.name, excel_file)
-            file_path = os.path.join(settings.MEDIA_ROOT, 'access_uploads', filename)
-            df = pd.read_excel(file_path)
-            expected_cols = ['Position', 'Name', 'Employee ID', 'Password', 'Region']
-            if not all(col in df.columns for col in expected_cols):
-                fs.delete(filename)
-                return Response({"error": f"Excel must contain columns: {expected_cols}"}, status=status.HTTP_400_BAD_REQUEST)
-            for _, row in df.iterrows():
-                employee_id = str(row['Employee ID']).strip()
-                position = str(row['Position']).strip()
-                name = row['Name']
-                password = str(row['Password'])
-                region = row['Region']
-                if position not in ['DM', 'AM', 'Seller']:
-                    continue
-                user, _ = AppUser.objects.get_or_create(employee_id=employee_id)
-                user.name = name
-                user.position = position
-                user.region = region
-                user.set_password(password)
-                user.save()
-            fs.delete(filename)
-            return Response({"success": True, "message": "User access data uploaded successfully"}, status=status.HTTP_200_OK)
+            file_path = save_upload(excel_file, 'access_uploads')
+            rejected = reject_bad_header(file_path, ACCESS_COLUMNS, ACCESS_COLUMNS_MESSAGE)
+            if rejected:
+                return rejected
+            job = enqueue_upload('access', file_path, excel_file.name, request.user)
+            return job_accepted_response(job)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class LoginView(APIView):
+    # A stale token in the header must not block logging in again
+    authentication_classes = []
     permission_classes = [AllowAny]
 
     def post(self, request):
@@ -405,7 +513,7 @@ class LoginView(APIView):
             return Response({"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
         if not user.check_password(password):
             return Response({"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
-        refresh = RefreshToken.for_user(user)
+        refresh = issue_tokens(user)
         return Response({
             'refresh': str(refresh),
             'access': str(refresh.access_token),
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 
 # --- Middleware ---
 MIDDLEWARE = [
+    'api.metrics.TimingMiddleware',  # First, so it times everything below it
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -118,6 +119,60 @@ if 'RENDER' in os.environ:
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# --- Token claims ---
+# How long (seconds) a worker trusts its cached token versions before re-reading them
+TOKEN_VERSION_TTL = int(os.getenv('TOKEN_VERSION_TTL', '30'))
+
+# --- Bulk payslip rendering ---
+# Size of the process pool that all /api/pdf/bulk/ exports in a web worker share, kept small
+# so exports cannot starve the worker; each export keeps at most twice this many slips in flight
+PAYSLIP_BULK_MAX_WORKERS = int(os.getenv('PAYSLIP_BULK_MAX_WORKERS', '2'))
+
+# --- Upload jobs ---
+# Uploads are parsed and persisted by a background thread pool; set UPLOAD_JOBS_ASYNC=0 to run them inline
+UPLOAD_JOBS_ASYNC = os.getenv('UPLOAD_JOBS_ASYNC', '1').lower() in ['1', 'true', 't']
+UPLOAD_JOB_WORKERS = int(os.getenv('UPLOAD_JOB_WORKERS', '1'))
+# Processes used to hash passwords during access-file imports
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+
+# --- Metrics ---
+# Per-request stage timing, Server-Timing headers and the /metrics endpoint
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1').lower() in ['1', 'true', 't']
+# /metrics accepts "Authorization: Bearer <METRICS_TOKEN>" when this is set, otherwise only staff logins
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# --- Consolidated data ---
+# Publish the consolidated frame once per data version as a memory-mapped Arrow file shared by all workers
+CONSOLIDATED_SNAPSHOTS = os.getenv('CONSOLIDATED_SNAPSHOTS', '1').lower() in ['1', 'true', 't']
+
+# --- Upload retention ---
+# manage.py compact_uploads folds the active payout uploads into one file and prunes media
+# no longer needed; with COMPACT_AFTER_UPLOAD=1 every payout upload job does the same
+COMPACT_AFTER_UPLOAD = os.getenv('COMPACT_AFTER_UPLOAD', '0').lower() in ['1', 'true', 't']
+# Superseded payout workbooks are kept for this many days, and the newest few always
+UPLOAD_RETENTION_DAYS = int(os.getenv('UPLOAD_RETENTION_DAYS', '30'))
+UPLOAD_RETENTION_KEEP = int(os.getenv('UPLOAD_RETENTION_KEEP', '5'))
+
+# --- ASGI ---
+# Under ASGI (see render.yaml) the read views run as async views that hand their
+# work to bounded thread pools: 'heavy' for raw data and PDFs, 'light' for cheap reads
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', '0').lower() in ['1', 'true', 't']
+ASYNC_HEAVY_WORKERS = int(os.getenv('ASYNC_HEAVY_WORKERS', '2'))
+ASYNC_LIGHT_WORKERS = int(os.getenv('ASYNC_LIGHT_WORKERS', '4'))
+
+# --- Logging ---
+# api.* loggers report failures in upload jobs and cache builds to stderr, which Render captures
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api': {'handlers': ['console'], 'level': os.getenv('API_LOG_LEVEL', 'INFO')},
+    },
+}
+
 # --- Static Files (WhiteNoise) ---
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
@@ -138,7 +193,7 @@ STATICFILES_DIRS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',